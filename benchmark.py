@@ -0,0 +1,228 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from fixtures import load_problem
+from problem import parse_problem
+from schedule_ortools import schedule_problem, solver_options_type
+
+# Benchmark of schedule_problem on seeded synthetic workloads.
+#   python benchmark.py run --tasks 50 200 --output new.json
+#   python benchmark.py compare old.json new.json
+
+
+# Random request with task_count tasks over horizon time units from 0. Tasks hold up
+# to two of tag_count tags, reserved_tag_count tag windows (a third of them opaque)
+# and reserved_interval_count events are spread over the horizon. tightness (0 to 1)
+# brings due dates closer to the start and max due dates closer to due dates.
+def generate_request(seed, task_count, tag_count=0, reserved_tag_count=0, reserved_interval_count=0, horizon=None, tightness=0.5):
+    rng = random.Random(seed)
+    horizon = horizon or task_count * 4
+    tags = ['tag%i' % tag_id for tag_id in range(tag_count)]
+    events = []
+    for task_id in range(task_count):
+        duration = rng.randint(1, 8)
+        latest_due_date = max(duration, round(horizon * (1 - tightness / 2)))
+        due_date = rng.randint(duration, latest_due_date)
+        events.append({
+            "id": task_id,
+            "impact": rng.randint(1, 10),
+            "duration": duration,
+            "dueDate": due_date,
+            "maxDueDate": due_date + round(rng.random() * (1 - tightness) * horizon / 4),
+            "tags": rng.sample(tags, rng.randint(0, min(2, len(tags))))
+        })
+    reserved_tags = []
+    for _ in range(reserved_tag_count):
+        window_start = rng.randint(0, horizon - 1)
+        reserved_tags.append({
+            "start": window_start,
+            "end": min(window_start + rng.randint(4, 48), horizon),
+            "tags": rng.sample(tags, rng.randint(1, min(3, len(tags)))) if tags else [],
+            "isTransparent": rng.random() >= 1 / 3
+        })
+    reserved_intervals = []
+    for _ in range(reserved_interval_count):
+        interval_start = rng.randint(0, horizon - 1)
+        reserved_intervals.append({"start": interval_start, "end": min(interval_start + rng.randint(1, 16), horizon)})
+    return {
+        "events": events,
+        "reservedIntervals": reserved_intervals,
+        "reservedTags": reserved_tags,
+        "start": 0
+    }
+
+
+def case_name(case):
+    if case.get("fixtures"):
+        return 'fixtures'
+    return 'tasks=%(tasks)i tags=%(tags)i reservedTags=%(reservedTags)i reservedIntervals=%(reservedIntervals)i horizon=%(horizon)s tightness=%(tightness)s seed=%(seed)i' % case
+
+
+# Solve one case and measure it. Peak RSS is the one of the process running the
+# case, run_cases gives each case a fresh process. Independent parts are solved in
+# that process unless options set maxWorkers: the process pool would start with
+# every case, its startup would count in the wall time and not in the peak RSS.
+def run_case(case, options):
+    if case.get("fixtures"):
+        data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+        problem = load_problem(os.path.join(data_path, 'tasks.csv'), os.path.join(data_path, 'tags.csv'))
+    else:
+        problem = parse_problem(generate_request(
+            case["seed"], case["tasks"], case["tags"], case["reservedTags"], case["reservedIntervals"], case["horizon"], case["tightness"]
+        ))
+    solver_options = solver_options_type(
+        time_limit_ms=options["timeLimitMs"],
+        num_workers=options["numWorkers"],
+        deterministic=options["deterministic"]
+    )
+    started_at = time.perf_counter()
+    result = schedule_problem(problem, objective=options["objective"], solver_options=solver_options, formulation=options["formulation"],
+                             mode=options.get("mode", 'cpsat'), max_workers=options.get("maxWorkers", 1))
+    wall_time = time.perf_counter() - started_at
+    return {
+        "name": case_name(case),
+        "case": case,
+        "status": result["status"],
+        "wallTime": wall_time,
+        "buildTime": result["model"]["buildTime"],
+        "variables": result["model"]["variables"],
+        "constraints": result["model"]["constraints"],
+        "components": result["components"],
+        "stages": [
+            {field: stage[field] for field in ("name", "status", "objective", "bestBound", "wallTime", "deterministicTime", "branches", "conflicts")}
+            for stage in result["stages"]
+        ],
+        "objectives": [stage["objective"] for stage in result["stages"]],
+        # ru_maxrss is in kilobytes on Linux
+        "peakRssMb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def run_cases(cases, options):
+    runs = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            run = executor.submit(run_case, case, options).result()
+        print('%-100s %-9s %8.2fs %8i vars %8i constraints objectives %s' % (
+            run["name"], run["status"], run["wallTime"], run["variables"], run["constraints"], run["objectives"]
+        ), file=sys.stderr)
+        runs.append(run)
+    return {
+        "createdAt": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "options": options,
+        "runs": runs
+    }
+
+
+# Stage objectives compare lexicographically, a stage without solution is the worst
+def objectives_key(run):
+    return [float('-inf') if objective is None else objective for objective in run["objectives"]]
+
+
+# Cases of a second run that got slower by more than threshold (relative) or
+# found a worse objective than the first run
+def compare_runs(old, new, threshold=0.2):
+    old_runs = {run["name"]: run for run in old["runs"]}
+    comparison = []
+    for run in new["runs"]:
+        old_run = old_runs.get(run["name"])
+        if old_run is None:
+            continue
+        regressions = []
+        # A search stopped by the time limit always takes the whole budget, compare what it found
+        if run["status"] == 'OPTIMAL' and old_run["status"] == 'OPTIMAL':
+            if run["wallTime"] > old_run["wallTime"] * (1 + threshold):
+                regressions.append('wallTime')
+        elif old_run["status"] == 'OPTIMAL':
+            regressions.append('status')
+        if objectives_key(run) < objectives_key(old_run):
+            regressions.append('objectives')
+        if run["peakRssMb"] > old_run["peakRssMb"] * (1 + threshold):
+            regressions.append('peakRssMb')
+        comparison.append({
+            "name": run["name"],
+            "wallTime": (old_run["wallTime"], run["wallTime"]),
+            "objectives": (old_run["objectives"], run["objectives"]),
+            "status": (old_run["status"], run["status"]),
+            "peakRssMb": (old_run["peakRssMb"], run["peakRssMb"]),
+            "regressions": regressions
+        })
+    return comparison
+
+
+def read_arguments(arguments):
+    parser = argparse.ArgumentParser(description='Benchmark the scheduler on seeded synthetic workloads')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--tasks', type=int, nargs='+', default=[50])
+    run_parser.add_argument('--tags', type=int, nargs='+', default=[0])
+    run_parser.add_argument('--reserved-tags', type=int, nargs='+', default=[0])
+    run_parser.add_argument('--reserved-intervals', type=int, nargs='+', default=[0])
+    run_parser.add_argument('--horizon', type=int, nargs='+', default=[None])
+    run_parser.add_argument('--tightness', type=float, nargs='+', default=[0.5])
+    run_parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    run_parser.add_argument('--fixtures', action='store_true', help='also run data/tasks.csv and data/tags.csv')
+    run_parser.add_argument('--objective', default='two_stage')
+    run_parser.add_argument('--formulation', default='nonlinear')
+    run_parser.add_argument('--mode', default='cpsat')
+    run_parser.add_argument('--time-limit-ms', type=int, default=10000)
+    run_parser.add_argument('--num-workers', type=int)
+    run_parser.add_argument('--deterministic', action='store_true')
+    run_parser.add_argument('--max-workers', type=int, default=1, help='processes solving independent parts of a case')
+    run_parser.add_argument('--output')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.2)
+    return parser.parse_args(arguments)
+
+
+def main(arguments):
+    arguments = read_arguments(arguments)
+    if arguments.command == 'run':
+        cases = [
+            {"tasks": tasks, "tags": tags, "reservedTags": reserved_tags, "reservedIntervals": reserved_intervals,
+             "horizon": horizon, "tightness": tightness, "seed": seed}
+            for tasks in arguments.tasks for tags in arguments.tags for reserved_tags in arguments.reserved_tags
+            for reserved_intervals in arguments.reserved_intervals for horizon in arguments.horizon
+            for tightness in arguments.tightness for seed in arguments.seeds
+        ]
+        if arguments.fixtures:
+            cases.append({"fixtures": True})
+        report = run_cases(cases, {
+            "objective": arguments.objective,
+            "formulation": arguments.formulation,
+            "mode": arguments.mode,
+            "timeLimitMs": arguments.time_limit_ms,
+            "numWorkers": arguments.num_workers,
+            "deterministic": arguments.deterministic,
+            "maxWorkers": arguments.max_workers
+        })
+        output = json.dumps(report, indent=2)
+        if arguments.output:
+            with open(arguments.output, 'w') as output_file:
+                output_file.write(output)
+        else:
+            print(output)
+        return 0
+    with open(arguments.old) as old_file, open(arguments.new) as new_file:
+        comparison = compare_runs(json.load(old_file), json.load(new_file), arguments.threshold)
+    for run in comparison:
+        print('%-100s %8.2fs -> %8.2fs objectives %s -> %s %s' % (
+            run["name"], run["wallTime"][0], run["wallTime"][1], run["objectives"][0], run["objectives"][1],
+            'REGRESSION ' + ', '.join(run["regressions"]) if run["regressions"] else ''
+        ))
+    return 1 if any([run["regressions"] for run in comparison]) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
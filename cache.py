@@ -0,0 +1,168 @@
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def shift_time(value, offset):
+    return None if value is None else value + offset
+
+
+# Shift every time of a request or a result, so that requests only differing by
+# their start share the same cache entry (the model only depends on time differences)
+def canonical_request(problem, options):
+    offset = -problem.start
+    tasks = sorted([
+        [str(task.id), task.impact, task.duration, task.due_date + offset, task.max_due_date + offset, sorted(task.tags)]
+        for task in problem.tasks
+    ])
+    reserved_intervals = sorted([
+        [reserved_interval.start + offset, reserved_interval.end + offset] for reserved_interval in problem.reserved_intervals
+    ])
+    reserved_tags = sorted([
+        [reserved_tag.start + offset, reserved_tag.end + offset, sorted(reserved_tag.tags), reserved_tag.is_transparent]
+        for reserved_tag in problem.reserved_tags
+    ])
+    previous_plan = {
+        str(task_id): [planned_task['start'] + offset, shift_time(planned_task.get('end'), offset), bool(planned_task['isPresent'])]
+        for task_id, planned_task in (options.get('previous_plan') or {}).items()
+    }
+    return {
+        "tasks": tasks,
+        "reservedIntervals": reserved_intervals,
+        "reservedTags": reserved_tags,
+        "objective": options.get('objective'),
+        "formulation": options.get('formulation', 'nonlinear'),
+        "solverOptions": options['solver_options']._asdict() if options.get('solver_options') else None,
+        "previousPlan": previous_plan,
+        "changedTasks": sorted([str(task_id) for task_id in options.get('changed_task_ids') or []]),
+        "freezeMargin": options.get('freeze_margin'),
+        "decompose": options.get('decompose', True),
+        "timeStep": options.get('time_step'),
+        "coarseTimeStep": options.get('coarse_time_step'),
+        "mode": options.get('mode', 'cpsat')
+    }
+
+
+# Hash of the normalized request, and the offset its times were shifted by
+def request_key(problem, options):
+    canonical = json.dumps(canonical_request(problem, options), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest(), -problem.start
+
+
+def shift_result(result, offset):
+    shifted = dict(result)
+    if result["tasks"]:
+        shifted["tasks"] = {
+            task_id: dict(planned_task, start=planned_task["start"] + offset, end=planned_task["end"] + offset)
+            for task_id, planned_task in result["tasks"].items()
+        }
+    return shifted
+
+
+class MemoryCache:
+    # LRU cache local to the worker process
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def size(self):
+        return len(self.entries)
+
+
+class SqliteCache:
+    # LRU cache in a SQLite file, shared by every worker process of the server
+    def __init__(self, path, max_size, ttl):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, stored_at REAL, used_at REAL)')
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with self.connect() as connection:
+            row = connection.execute('SELECT value, stored_at FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, stored_at = row
+            if time.time() - stored_at > self.ttl:
+                connection.execute('DELETE FROM results WHERE key = ?', (key,))
+                return None
+            connection.execute('UPDATE results SET used_at = ? WHERE key = ?', (time.time(), key))
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, value, now, now))
+            connection.execute('DELETE FROM results WHERE stored_at < ?', (now - self.ttl,))
+            connection.execute('DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY used_at DESC LIMIT ?)', (self.max_size,))
+
+    def size(self):
+        with self.connect() as connection:
+            return connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+class ResultCache:
+    # Cache of schedule results keyed by request, with hit/miss counters.
+    # Results are stored as JSON, relative to the request start.
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, offset):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(shift_result(json.loads(value), -offset), cached=True)
+
+    def set(self, key, offset, result):
+        # Only proven results are stored, a timed out search could do better next time
+        if result["status"] in ('OPTIMAL', 'INFEASIBLE'):
+            self.backend.set(key, json.dumps(shift_result(result, offset), default=str))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": self.backend.size()
+        }
+
+
+# Build the cache configured for the server: a SQLite file when path is set,
+# an in-process LRU otherwise, nothing when max_size is 0
+def create_cache(max_size, ttl, path=None):
+    if not max_size:
+        return None
+    if path:
+        return ResultCache(SqliteCache(path, max_size, ttl))
+    return ResultCache(MemoryCache(max_size, ttl))
@@ -0,0 +1,188 @@
+import io
+import json
+import numpy as np
+import zipfile
+from problem import Problem, ReservedInterval, ReservedTag, Task
+
+# Columnar binary format of requests and responses, for callers sending many tasks:
+# a NumPy .npz archive (uncompressed, no pickled objects) of one array per field.
+#
+# Request arrays (task arrays have one row per task):
+#   taskIds, impacts, durations, dueDates, maxDueDates (optional, dueDates by default)
+#   tagNames: tag names, referenced by their index in taskTags and windowTags
+#   taskTags, taskTagOffsets: tags of task i are taskTags[taskTagOffsets[i]:taskTagOffsets[i + 1]]
+#   reservedStarts, reservedEnds: reserved intervals
+#   windowStarts, windowEnds, windowTransparent, windowTags, windowTagOffsets: reserved tags
+#   start: 0-d array
+#   options (optional): 0-d string array, JSON object of the JSON request options
+# Response arrays, one row per task in request order: taskIds, starts, ends,
+# isPresent, isLate, priorities, delays (and moved for incremental requests), and
+# summary: 0-d string array, JSON of every other field of the JSON response.
+
+def read_columns(data):
+    try:
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            return {name: archive[name] for name in archive.files}
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        raise ValueError(f'Invalid .npz body: {e}')
+
+
+def write_columns(arrays):
+    output = io.BytesIO()
+    np.savez(output, **arrays)
+    return output.getvalue()
+
+
+def integer_column(arrays, name, length=None, default=None):
+    if name not in arrays:
+        if default is None:
+            raise ValueError(f'Missing {name}')
+        return default
+    column = arrays[name]
+    if column.ndim != 1 or not np.issubdtype(column.dtype, np.integer):
+        raise ValueError(f'{name} should be a one dimension integer array')
+    if length is not None and len(column) != length:
+        raise ValueError(f'{name} should have {length} rows, got {len(column)}')
+    return column
+
+
+# Tag sets of the rows of a table whose tags are coded as indices of tag_names
+def tag_sets(arrays, tags_name, offsets_name, row_count, tag_names):
+    if row_count == 0 and tags_name not in arrays:
+        return []
+    tags = integer_column(arrays, tags_name)
+    offsets = integer_column(arrays, offsets_name, row_count + 1)
+    if offsets[0] != 0 or offsets[-1] != len(tags) or np.any(np.diff(offsets) < 0):
+        raise ValueError(f'{offsets_name} should go from 0 to the length of {tags_name} without decreasing')
+    if len(tags) and (tags.min() < 0 or tags.max() >= len(tag_names)):
+        raise ValueError(f'{tags_name} should be indices of tagNames')
+    # Tag sets are shared between the rows holding the same tags
+    tag_sets_by_codes = {}
+    row_tags = []
+    tags, offsets = tags.tolist(), offsets.tolist()
+    for row in range(row_count):
+        codes = tuple(tags[offsets[row]:offsets[row + 1]])
+        if codes not in tag_sets_by_codes:
+            tag_sets_by_codes[codes] = frozenset([tag_names[code] for code in codes])
+        row_tags.append(tag_sets_by_codes[codes])
+    return row_tags
+
+
+# Build a problem from the request arrays, validated per column
+def problem_from_columns(arrays):
+    if 'taskIds' not in arrays or arrays['taskIds'].ndim != 1:
+        raise ValueError('Missing taskIds')
+    task_ids = arrays['taskIds']
+    if not (np.issubdtype(task_ids.dtype, np.integer) or np.issubdtype(task_ids.dtype, np.str_)):
+        raise ValueError('taskIds should be integers or strings')
+    task_count = len(task_ids)
+    impacts = arrays.get('impacts')
+    if impacts is None or impacts.shape != (task_count,) or not (np.issubdtype(impacts.dtype, np.integer) or np.issubdtype(impacts.dtype, np.floating)):
+        raise ValueError(f'impacts should be {task_count} numbers')
+    if np.any(np.isnan(impacts)):
+        impacts = np.nan_to_num(impacts)
+    durations = integer_column(arrays, 'durations', task_count)
+    if np.any(durations <= 0):
+        raise ValueError('durations should be positive')
+    due_dates = integer_column(arrays, 'dueDates', task_count)
+    max_due_dates = integer_column(arrays, 'maxDueDates', task_count, due_dates)
+    if np.any(max_due_dates < due_dates):
+        raise ValueError('maxDueDates should not be before dueDates')
+    tag_names = arrays['tagNames'].tolist() if 'tagNames' in arrays else []
+    task_tags = tag_sets(arrays, 'taskTags', 'taskTagOffsets', task_count, tag_names)
+
+    reserved_starts = integer_column(arrays, 'reservedStarts', default=np.zeros(0, dtype=np.int64))
+    reserved_ends = integer_column(arrays, 'reservedEnds', len(reserved_starts), np.zeros(0, dtype=np.int64))
+    window_starts = integer_column(arrays, 'windowStarts', default=np.zeros(0, dtype=np.int64))
+    window_count = len(window_starts)
+    window_ends = integer_column(arrays, 'windowEnds', window_count, np.zeros(0, dtype=np.int64))
+    window_transparent = arrays.get('windowTransparent', np.zeros(window_count, dtype=bool))
+    if window_transparent.shape != (window_count,):
+        raise ValueError(f'windowTransparent should have {window_count} rows')
+    if np.any(reserved_ends < reserved_starts) or np.any(window_ends < window_starts):
+        raise ValueError('end should not be before start')
+    window_tags = tag_sets(arrays, 'windowTags', 'windowTagOffsets', window_count, tag_names)
+    if 'start' not in arrays or arrays['start'].ndim != 0 or not np.issubdtype(arrays['start'].dtype, np.integer):
+        raise ValueError('Missing start')
+
+    return Problem(
+        tasks=[
+            Task(id=task_id, impact=impact, duration=duration, due_date=due_date, max_due_date=max_due_date, tags=tags)
+            for task_id, impact, duration, due_date, max_due_date, tags in zip(
+                task_ids.tolist(), impacts.tolist(), durations.tolist(), due_dates.tolist(), max_due_dates.tolist(), task_tags
+            )
+        ],
+        reserved_intervals=[
+            ReservedInterval(start=start, end=end) for start, end in zip(reserved_starts.tolist(), reserved_ends.tolist())
+        ],
+        reserved_tags=[
+            ReservedTag(start=start, end=end, tags=tags, is_transparent=is_transparent)
+            for start, end, tags, is_transparent in zip(window_starts.tolist(), window_ends.tolist(), window_tags, window_transparent.tolist())
+        ],
+        start=int(arrays['start'])
+    )
+
+
+# Request arrays of a problem, with options the JSON request options
+def request_columns(problem, options=None):
+    tag_names = sorted(set().union(*[task.tags for task in problem.tasks], *[window.tags for window in problem.reserved_tags]))
+    codes = {tag: code for code, tag in enumerate(tag_names)}
+
+    def coded_tags(rows):
+        tags = [sorted([codes[tag] for tag in row.tags]) for row in rows]
+        return np.array([code for row_codes in tags for code in row_codes], dtype=np.int32), \
+            np.cumsum([0] + [len(row_codes) for row_codes in tags], dtype=np.int64)
+
+    task_tags, task_tag_offsets = coded_tags(problem.tasks)
+    window_tags, window_tag_offsets = coded_tags(problem.reserved_tags)
+    arrays = {
+        "taskIds": np.array([task.id for task in problem.tasks]) if problem.tasks else np.zeros(0, dtype=np.int64),
+        "impacts": np.array([task.impact for task in problem.tasks], dtype=np.float64),
+        "durations": np.array([task.duration for task in problem.tasks], dtype=np.int64),
+        "dueDates": np.array([task.due_date for task in problem.tasks], dtype=np.int64),
+        "maxDueDates": np.array([task.max_due_date for task in problem.tasks], dtype=np.int64),
+        "tagNames": np.array(tag_names, dtype=str),
+        "taskTags": task_tags,
+        "taskTagOffsets": task_tag_offsets,
+        "reservedStarts": np.array([reserved_interval.start for reserved_interval in problem.reserved_intervals], dtype=np.int64),
+        "reservedEnds": np.array([reserved_interval.end for reserved_interval in problem.reserved_intervals], dtype=np.int64),
+        "windowStarts": np.array([window.start for window in problem.reserved_tags], dtype=np.int64),
+        "windowEnds": np.array([window.end for window in problem.reserved_tags], dtype=np.int64),
+        "windowTransparent": np.array([window.is_transparent for window in problem.reserved_tags], dtype=bool),
+        "windowTags": window_tags,
+        "windowTagOffsets": window_tag_offsets,
+        "start": np.array(problem.start, dtype=np.int64)
+    }
+    if options:
+        arrays["options"] = np.array(json.dumps(options))
+    return arrays
+
+
+# JSON request options of the request arrays
+def options_from_columns(arrays):
+    if 'options' not in arrays:
+        return {}
+    options = json.loads(str(arrays['options']))
+    if not isinstance(options, dict):
+        raise ValueError('options should be a JSON object')
+    return options
+
+
+# Response arrays of a schedule result, with the tasks in the order of the problem.
+# Tasks are matched by their id as a string, as in cached results that went through JSON.
+def result_columns(result, problem):
+    planned_tasks_by_id = {str(task_id): planned_task for task_id, planned_task in (result["tasks"] or {}).items()}
+    planned_tasks = [planned_tasks_by_id[str(task.id)] for task in problem.tasks] if planned_tasks_by_id else []
+    arrays = {
+        "taskIds": np.array([task.id for task in problem.tasks]) if planned_tasks else np.zeros(0, dtype=np.int64),
+        "starts": np.array([planned_task["start"] for planned_task in planned_tasks], dtype=np.int64),
+        "ends": np.array([planned_task["end"] for planned_task in planned_tasks], dtype=np.int64),
+        "isPresent": np.array([planned_task["isPresent"] for planned_task in planned_tasks], dtype=bool),
+        "isLate": np.array([planned_task["isLate"] for planned_task in planned_tasks], dtype=bool),
+        "priorities": np.array([planned_task["priority"] for planned_task in planned_tasks], dtype=np.int64),
+        "delays": np.array([planned_task["delay"] for planned_task in planned_tasks], dtype=np.int64),
+        "summary": np.array(json.dumps({field: value for field, value in result.items() if field != "tasks"}, default=str))
+    }
+    if planned_tasks and "moved" in planned_tasks[0]:
+        arrays["moved"] = np.array([planned_task["moved"] for planned_task in planned_tasks], dtype=bool)
+    return arrays
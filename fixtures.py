@@ -0,0 +1,37 @@
+import ast
+import csv
+from problem import parse_problem
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as csv_file:
+        return list(csv.DictReader(csv_file, delimiter=';'))
+
+
+def read_optional_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+# Build a problem from the CSV exports of data/ (tasks.csv and tags.csv). Tasks are
+# identified by their row, tasks without due date are due at default_due_date
+# (the end of the last tag window by default), tag windows are opaque.
+def load_problem(tasks_path, tags_path, start=0, default_due_date=None):
+    tag_rows = read_csv(tags_path)
+    reserved_tags = [
+        {"start": int(row['Start']), "end": int(row['End']), "tags": ast.literal_eval(row['Tags'])}
+        for row in tag_rows
+    ]
+    if default_due_date is None:
+        default_due_date = max([reserved_tag["end"] for reserved_tag in reserved_tags], default=start)
+    events = []
+    for row_id, row in enumerate(read_csv(tasks_path)):
+        due_date = read_optional_int(row['DueDate'])
+        events.append({
+            "id": row_id,
+            "impact": int(row['Impact']),
+            "duration": int(row['Duration']),
+            "dueDate": default_due_date if due_date is None else due_date,
+            "maxDueDate": read_optional_int(row['MaxDueDate']),
+            "tags": ast.literal_eval(row['Tags']) if row['Tags'] else []
+        })
+    return parse_problem({"events": events, "reservedIntervals": [], "reservedTags": reserved_tags, "start": start})
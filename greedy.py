@@ -0,0 +1,121 @@
+import bisect
+import math
+import time
+from presolve import presolve
+from problem import mark_moved_tasks, truncated_division
+
+# Heuristic schedule without the solver, for requests that need an answer in a few
+# milliseconds. Like solve_problem, times are counted in steps of time_step.
+
+
+# Earliest start of the sorted [first, last] ranges at which a task of given
+# duration does not overlap the occupied intervals, given as the sorted starts
+# and ends of disjoint, non touching [start, end) intervals. None if the task fits nowhere.
+def earliest_free_start(ranges, duration, occupied_starts, occupied_ends):
+    for first, last in ranges:
+        candidate = first
+        while candidate <= last:
+            # First occupied interval ending after the candidate start
+            position = bisect.bisect_right(occupied_ends, candidate)
+            if position == len(occupied_starts) or occupied_starts[position] >= candidate + duration:
+                return candidate
+            candidate = occupied_ends[position]
+    return None
+
+
+# Place tasks one by one by decreasing impact per duration (then due date): each
+# task takes the earliest free start of its domain, which also gives it the
+# greatest delay, or is left out when it fits nowhere or is pruned. With a previous plan, the
+# unchanged tasks first keep their previous start when it is still free.
+# Returns a result like solve_problem, with a single 'greedy' stage whose objective
+# is the total raw priority.
+def greedy_schedule(problem, horizon, time_step, previous_plan=None, changed_task_ids=None):
+    started_at = time.perf_counter()
+    presolved = presolve(problem, horizon, time_step)
+    domains = presolved.start_ranges
+    build_time = time.perf_counter() - started_at
+
+    order = sorted(range(len(problem.tasks)), key=lambda task_id: (
+        -problem.tasks[task_id].impact / problem.tasks[task_id].duration, problem.tasks[task_id].due_date, task_id
+    ))
+    occupied_starts, occupied_ends = [], []
+    starts = {}
+
+    # Touching intervals are coalesced, so that a search skips a packed block at once
+    def place(task_id, start):
+        end = start + problem.tasks[task_id].duration
+        position = bisect.bisect_right(occupied_ends, start)
+        touches_previous = position > 0 and occupied_ends[position - 1] == start
+        touches_next = position < len(occupied_starts) and occupied_starts[position] == end
+        if touches_previous and touches_next:
+            occupied_ends[position - 1] = occupied_ends.pop(position)
+            del occupied_starts[position]
+        elif touches_previous:
+            occupied_ends[position - 1] = end
+        elif touches_next:
+            occupied_starts[position] = start
+        else:
+            occupied_starts.insert(position, start)
+            occupied_ends.insert(position, end)
+        starts[task_id] = start
+
+    previous_plan = {str(task_id): planned_task for task_id, planned_task in (previous_plan or {}).items()}
+    if previous_plan:
+        changed_task_ids = set([str(task_id) for task_id in (changed_task_ids or [])])
+        for task_id in order:
+            task = problem.tasks[task_id]
+            planned_task = previous_plan.get(str(task.id))
+            if planned_task is None or not planned_task['isPresent'] or str(task.id) in changed_task_ids:
+                continue
+            if 'end' in planned_task and planned_task['end'] - planned_task['start'] != task.duration:
+                continue
+            previous_start = int(planned_task['start'])
+            if any([first <= previous_start <= last for first, last in domains[task_id]]) and \
+                    earliest_free_start([(previous_start, previous_start)], task.duration, occupied_starts, occupied_ends) is not None:
+                place(task_id, previous_start)
+
+    for task_id in order:
+        if task_id not in starts:
+            start = earliest_free_start(domains[task_id], problem.tasks[task_id].duration, occupied_starts, occupied_ends)
+            if start is not None:
+                place(task_id, start)
+
+    planned_tasks = {}
+    total_raw_priority = 0
+    for task_id, task in enumerate(problem.tasks):
+        start = starts.get(task_id)
+        delay, priority = 0, 0
+        if start is not None:
+            raw_priority = math.floor(task.impact * 100 / (task.duration * time_step))
+            total_raw_priority += raw_priority
+            priority = raw_priority
+            if task.max_due_date != task.due_date:
+                delay = truncated_division((task.due_date - start - task.duration) * 100, task.max_due_date - task.due_date)
+                priority = raw_priority * delay
+        planned_tasks[task.id] = {
+            "start": problem.start if start is None else start,
+            "isLate": start is not None and start + task.duration > task.due_date,
+            "isPresent": start is not None,
+            "end": (problem.start if start is None else start) + task.duration,
+            "priority": priority,
+            "delay": delay
+        }
+    if previous_plan:
+        mark_moved_tasks(planned_tasks, previous_plan)
+    return {
+        "found": True,
+        "status": 'FEASIBLE',
+        "stages": [{
+            "name": 'greedy',
+            "status": 'FEASIBLE',
+            "objective": total_raw_priority,
+            "bestBound": None,
+            "wallTime": time.perf_counter() - started_at - build_time,
+            "deterministicTime": 0,
+            "branches": 0,
+            "conflicts": 0
+        }],
+        "model": {"variables": 0, "constraints": 0, "buildTime": build_time},
+        "pruned": {problem.tasks[task_id].id: reason for task_id, reason in presolved.pruned.items()},
+        "tasks": planned_tasks
+    }
@@ -1,21 +1,330 @@
-from flask import Flask, request
-from schedule_ortools import schedule
-import pandas as pd
+from flask import Flask, Response, request
+from problem import parse_problem, read_changed_tasks, read_freeze_margin, read_previous_plan, read_solver_limits
+from cache import create_cache, request_key
+from metrics import Registry
+from jobs import JobManager, QueueFullError
+import json
+import logging
+import threading
+import time
 import traceback
+import os
+
+# One JSON line per request at INFO, solver stages and solutions at DEBUG
+logging.basicConfig(level=os.environ.get('SCHEDULER_LOG_LEVEL', 'INFO').upper(), format='%(asctime)s %(levelname)s %(name)s %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
 
+# Read a server-wide default from the environment
+def env_option(name, cast, default=None):
+    if os.environ.get(name) in (None, ''):
+        return default
+    return cast(os.environ[name])
+
+
+def parse_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+# The solver takes a large part of the start time of a worker: it is imported on
+# first use, and in a background thread unless SCHEDULER_PRELOAD is false, so that
+# a new worker answers right away. With SCHEDULER_PRESTART_WORKERS, the processes
+# solving independent parts of requests are also started ahead of the first request.
+def scheduler():
+    import schedule_ortools
+    return schedule_ortools
+
+
+def preload_scheduler():
+    scheduler()
+    if env_option('SCHEDULER_PRESTART_WORKERS', parse_bool, False):
+        scheduler().start_process_pool(max_workers)
+
+
+# Columnar binary format of requests and responses (see columns.py), NumPy is only
+# imported for the requests using it
+columns_mimetype = 'application/x-npz'
+
+
+def columnar():
+    import columns
+    return columns
+
+
+# Server-wide solver defaults, each can be overridden per request
+default_solver_options = {
+    "time_limit_ms": env_option('SCHEDULER_TIME_LIMIT_MS', int),
+    "num_workers": env_option('SCHEDULER_NUM_WORKERS', int),
+    "relative_gap": env_option('SCHEDULER_RELATIVE_GAP', float),
+    "deterministic": env_option('SCHEDULER_DETERMINISTIC', parse_bool, False)
+}
+
+
+# Processes solving independent parts of a request (one per CPU by default)
+max_workers = env_option('SCHEDULER_MAX_WORKERS', int)
+
+if env_option('SCHEDULER_PRELOAD', parse_bool, True):
+    threading.Thread(target=preload_scheduler, name='preload', daemon=True).start()
+
+
+# Result cache shared by the requests of this worker, or by every worker when
+# SCHEDULER_CACHE_PATH points to a SQLite file (set SCHEDULER_CACHE_SIZE to 0 to disable)
+result_cache = create_cache(
+    max_size=env_option('SCHEDULER_CACHE_SIZE', int, 256),
+    ttl=env_option('SCHEDULER_CACHE_TTL', float, 3600),
+    path=os.environ.get('SCHEDULER_CACHE_PATH')
+)
+
+
+registry = Registry()
+request_seconds = registry.histogram('scheduler_request_seconds', 'Time to answer schedule requests')
+span_seconds = registry.histogram('scheduler_span_seconds', 'Time spent in each step of schedule requests (parse, build and solver stages)')
+requests_total = registry.counter('scheduler_requests_total', 'Schedule requests by outcome')
+stages_total = registry.counter('scheduler_stages_total', 'Solver stages by status')
+model_variables_total = registry.counter('scheduler_model_variables_total', 'Variables of the models built')
+model_constraints_total = registry.counter('scheduler_model_constraints_total', 'Constraints of the models built')
+solver_branches_total = registry.counter('scheduler_solver_branches_total', 'Solver branches by stage')
+solver_conflicts_total = registry.counter('scheduler_solver_conflicts_total', 'Solver conflicts by stage')
+pruned_tasks_total = registry.counter('scheduler_pruned_tasks_total', 'Tasks pruned before building the model, by reason')
+
+
+# Record the time spans, model size and solver statistics of a request in the
+# metrics and in a structured log line
+def record_request(outcome, request_time, parse_time=None, result=None):
+    request_seconds.observe(request_time)
+    requests_total.inc(outcome=outcome)
+    line = {"event": 'request', "outcome": outcome, "requestTime": request_time, "parseTime": parse_time}
+    if parse_time is not None:
+        span_seconds.observe(parse_time, span='parse')
+    if result is not None and outcome != 'cached' and "model" in result:
+        span_seconds.observe(result["model"]["buildTime"], span='build')
+        model_variables_total.inc(result["model"]["variables"])
+        model_constraints_total.inc(result["model"]["constraints"])
+        for stage in result["stages"]:
+            span_seconds.observe(stage["wallTime"], span=stage["name"])
+            stages_total.inc(stage=stage["name"], status=stage["status"])
+            solver_branches_total.inc(stage["branches"], stage=stage["name"])
+            solver_conflicts_total.inc(stage["conflicts"], stage=stage["name"])
+        for reason in result.get("pruned", {}).values():
+            pruned_tasks_total.inc(reason=reason)
+        line.update({
+            "buildTime": result["model"]["buildTime"],
+            "variables": result["model"]["variables"],
+            "constraints": result["model"]["constraints"],
+            "components": result["components"],
+            "pruned": len(result.get("pruned", {})),
+            "stages": [
+                {field: stage[field] for field in ("name", "status", "wallTime", "branches", "conflicts")} for stage in result["stages"]
+            ]
+        })
+    logger.info('%s', json.dumps(line))
+
+
+# Background schedules of the /jobs API. Jobs live in this process, so the server
+# runs a single worker process with threads.
+job_manager = JobManager(
+    max_workers=env_option('SCHEDULER_JOB_WORKERS', int, 2),
+    max_queued=env_option('SCHEDULER_JOB_QUEUE', int, 16),
+    ttl=env_option('SCHEDULER_JOB_TTL', float, 3600)
+)
+
+
+def read_solver_options(data):
+    return scheduler().solver_options_type(
+        **read_solver_limits(data, default_solver_options),
+        deterministic=bool(data.get('deterministic', default_solver_options["deterministic"]))
+    )
+
+
+# Scheduling options of a request, as keyword arguments of schedule_problem
+def read_options(data):
+    return {
+        "objective": data.get('objective', 'two_stage'),
+        "formulation": data.get('formulation', 'nonlinear'),
+        "solver_options": read_solver_options(data),
+        "previous_plan": read_previous_plan(data),
+        "changed_task_ids": read_changed_tasks(data),
+        "freeze_margin": read_freeze_margin(data),
+        "decompose": bool(data.get('decompose', True)),
+        "time_step": data.get('timeStep'),
+        "coarse_time_step": data.get('coarseTimeStep'),
+        "mode": data.get('mode', 'cpsat'),
+        "max_workers": max_workers
+    }
+
+
+# Schedule a parsed request through the result cache. search holds the on_solution
+# and search_control arguments of a job.
+def solve_request(problem, options, started_at, parse_time, **search):
+    if result_cache is not None:
+        key, offset = request_key(problem, options)
+        result = result_cache.get(key, offset)
+        if result is not None:
+            record_request('cached', time.perf_counter() - started_at, parse_time, result)
+            return result
+    result = scheduler().schedule_problem(problem, **options, **search)
+    if result_cache is not None:
+        result_cache.set(key, offset, result)
+    record_request(result["status"], time.perf_counter() - started_at, parse_time, result)
+    return result
+
+
+# Requests and responses are JSON, or NumPy columns when the Content-Type or the
+# Accept header is columns_mimetype
 @app.route("/", methods=['POST'])
 def schedule_events():
+    started_at = time.perf_counter()
     try:
-        data = request.get_json()
-        tasks = pd.json_normalize(data['events'])
-        reserved_intervals = pd.json_normalize(data['reservedIntervals'])
-        reserved_tags = pd.json_normalize(data['reservedTags'])
-        start = data['start']
-        result = schedule(tasks, reserved_intervals, reserved_tags, start)
+        if request.mimetype == columns_mimetype:
+            arrays = columnar().read_columns(request.get_data())
+            problem = columnar().problem_from_columns(arrays)
+            options = read_options(columnar().options_from_columns(arrays))
+        else:
+            data = request.get_json()
+            problem = parse_problem(data)
+            options = read_options(data)
+        result = solve_request(problem, options, started_at, time.perf_counter() - started_at)
+        if request.accept_mimetypes.best_match(['application/json', columns_mimetype]) == columns_mimetype:
+            return columnar().write_columns(columnar().result_columns(result, problem)), 200, {'Content-Type': columns_mimetype}
         return result, 200
+    except ValueError as e:
+        record_request('invalid', time.perf_counter() - started_at)
+        return str(e), 400
     except Exception as e:
         traceback.print_exception(e)
-        return 'An error occurred', 500
\ No newline at end of file
+        record_request('error', time.perf_counter() - started_at)
+        return 'An error occurred', 500
+
+
+# Schedule a list of independent requests ("requests") on the process pool. The
+# response lists the results in order, or streams one JSON line per result as
+# they complete ({"index", "result"}) when "stream" is set. Invalid or failing
+# requests get an INVALID or ERROR result without failing the batch.
+@app.route("/batch", methods=['POST'])
+def schedule_batch_events():
+    started_at = time.perf_counter()
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        record_request('invalid', time.perf_counter() - started_at)
+        return 'Expected a list of requests', 400
+    results = [None] * len(data['requests'])
+    batch_ids, problems, options, keys = [], [], [], []
+    for request_id, request_data in enumerate(data['requests']):
+        try:
+            problem = parse_problem(request_data)
+            request_options = read_options(request_data)
+            key = request_key(problem, request_options) if result_cache is not None else None
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            record_request('invalid', time.perf_counter() - started_at)
+            results[request_id] = scheduler().batch_error('INVALID', e)
+            continue
+        if key is not None:
+            result = result_cache.get(*key)
+            if result is not None:
+                record_request('cached', time.perf_counter() - started_at, result=result)
+                results[request_id] = result
+                continue
+        batch_ids.append(request_id)
+        problems.append(problem)
+        options.append(request_options)
+        keys.append(key)
+    stream = bool(data.get('stream', False))
+
+    def solved_results():
+        for request_id, result in enumerate(results):
+            if result is not None:
+                yield request_id, result
+        for batch_id, result in scheduler().schedule_batch(problems, options, max_workers, ordered=not stream):
+            if keys[batch_id] is not None and "error" not in result:
+                result_cache.set(*keys[batch_id], result)
+            record_request(result["status"].lower() if "error" in result else result["status"], time.perf_counter() - started_at, result=result)
+            yield batch_ids[batch_id], result
+
+    if stream:
+        return Response(
+            (json.dumps({"index": request_id, "result": result}, default=str) + '\n' for request_id, result in solved_results()),
+            mimetype='application/x-ndjson'
+        )
+    for request_id, result in solved_results():
+        results[request_id] = result
+    return {"results": results}, 200
+
+
+@app.route("/cache", methods=['GET'])
+def cache_stats():
+    if result_cache is None:
+        return {"enabled": False}, 200
+    return dict(result_cache.stats(), enabled=True), 200
+
+
+@app.route("/metrics", methods=['GET'])
+def metrics():
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+# Start a schedule in the background, the response holds the job id
+@app.route("/jobs", methods=['POST'])
+def create_job():
+    started_at = time.perf_counter()
+    try:
+        data = request.get_json()
+        problem = parse_problem(data)
+        options = read_options(data)
+        parse_time = time.perf_counter() - started_at
+        job = job_manager.submit(lambda job: solve_request(
+            problem, options, started_at, parse_time, on_solution=job.add_solution, search_control=job.search_control
+        ))
+        return {"id": job.id, "status": job.status}, 202, {'Location': f'/jobs/{job.id}'}
+    except ValueError as e:
+        record_request('invalid', time.perf_counter() - started_at)
+        return str(e), 400
+    except QueueFullError as e:
+        return str(e), 503
+
+
+# Status of a job, with its result once finished or the best tasks found so far
+@app.route("/jobs/<job_id>", methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return 'Unknown job', 404
+    return job.describe(), 200
+
+
+# Cancel a job, a running job keeps the best schedule found so far
+@app.route("/jobs/<job_id>", methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return 'Unknown job', 404
+    return job.describe(), 200
+
+
+# Server-sent events of a job: each improving solution ("solution"), then the
+# result ("done", "cancelled" or "failed"). Last-Event-ID resumes a stream.
+@app.route("/jobs/<job_id>/events", methods=['GET'])
+def stream_job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return 'Unknown job', 404
+    try:
+        first_event = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        return 'Last-Event-ID should be an integer', 400
+
+    def stream():
+        event_id = first_event
+        while True:
+            events = job.wait_events(event_id, timeout=15)
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+            for name, data in events:
+                yield f'id: {event_id}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n'
+                event_id += 1
+                if name in ('done', 'cancelled', 'failed'):
+                    return
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
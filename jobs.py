@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    # A schedule running in the background. Events (improving solutions, then the
+    # result) are kept so that every stream can replay them from the start.
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result = None
+        # Best tasks found so far, merged over the independent parts of the problem
+        self.tasks = {}
+        self.events = []
+        self.condition = threading.Condition()
+        # Imported here, the server only loads the solver once it needs it
+        from schedule_ortools import SearchControl
+        self.search_control = SearchControl()
+        self.future = None
+
+    def add_event(self, name, data):
+        with self.condition:
+            self.events.append((name, data))
+            self.condition.notify_all()
+
+    # on_solution of schedule_problem
+    def add_solution(self, stage, objective, tasks):
+        with self.condition:
+            self.tasks.update(tasks)
+        self.add_event('solution', {"stage": stage, "objective": objective, "tasks": tasks})
+
+    def finish(self, status, result):
+        with self.condition:
+            self.status = status
+            self.result = result
+            self.finished_at = time.time()
+        self.add_event(status, result)
+
+    def is_finished(self):
+        return self.finished_at is not None
+
+    # Events from index on, waiting up to timeout for new ones. Returns an empty list on timeout.
+    def wait_events(self, index, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events) > index, timeout)
+            return self.events[index:]
+
+    def describe(self):
+        with self.condition:
+            description = {"id": self.id, "status": self.status, "createdAt": self.created_at, "finishedAt": self.finished_at}
+            if self.is_finished():
+                description["result"] = self.result
+            else:
+                description["tasks"] = dict(self.tasks)
+            return description
+
+
+class JobManager:
+    # Runs jobs on max_workers threads (the solver releases the GIL while it searches),
+    # with at most max_queued jobs waiting. Finished jobs are kept ttl seconds.
+    def __init__(self, max_workers, max_queued, ttl):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    # Start run(job) in the background, it returns the result of the job
+    def submit(self, run):
+        job = Job()
+        with self.lock:
+            self.remove_expired()
+            if len([queued_job for queued_job in self.jobs.values() if queued_job.status == 'queued']) >= self.max_queued:
+                raise QueueFullError('Too many queued jobs')
+            self.jobs[job.id] = job
+            job.future = self.executor.submit(self.run, job, run)
+        return job
+
+    def run(self, job, run):
+        with job.condition:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+        try:
+            result = run(job)
+            job.finish('cancelled' if job.search_control.stopped else 'done', result)
+        except Exception as e:
+            job.finish('failed', {"error": str(e)})
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    # A queued job never starts, a running job stops with the best schedule found so far
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.condition:
+            queued = job.status == 'queued'
+            if queued:
+                job.status = 'cancelling'
+        if queued:
+            job.future.cancel()
+            job.finish('cancelled', None)
+        else:
+            job.search_control.stop()
+        return job
+
+    def remove_expired(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.is_finished() and now - job.finished_at > self.ttl]:
+            del self.jobs[job_id]
@@ -0,0 +1,83 @@
+import threading
+
+# Metrics of a server process in the Prometheus text format. Each worker process
+# of the server keeps its own values.
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join([
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels
+    ]) + '}'
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, buckets=latency_buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # Per label set: count per bucket (not cumulative), sum and count of observations
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            bucket_counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0, 0))
+            for bucket_id, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    bucket_counts[bucket_id] += 1
+                    break
+            self.values[key] = (bucket_counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, (bucket_counts, total, count) in sorted(self.values.items()):
+                cumulative_count = 0
+                for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative_count += bucket_count
+                    lines.append(f'{self.name}_bucket{format_labels(key + (("le", bucket),))} {cumulative_count}')
+                lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {count}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {total}')
+                lines.append(f'{self.name}_count{format_labels(key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, description):
+        self.metrics.append(Counter(name, description))
+        return self.metrics[-1]
+
+    def histogram(self, name, description, buckets=latency_buckets):
+        self.metrics.append(Histogram(name, description, buckets))
+        return self.metrics[-1]
+
+    def render(self):
+        return '\n'.join([line for metric in self.metrics for line in metric.render()]) + '\n'
@@ -0,0 +1,65 @@
+import collections
+import math
+from problem import latest_end
+from timeline import interval_indexes
+
+# Presolve of a problem before its model is built. Like solve_problem, times are
+# counted in steps of time_step.
+
+# Greatest delay of a task in %, a task cannot end so early that its delay goes over it
+max_delay = 10000
+
+# start_ranges: start ranges of each task (empty for pruned tasks)
+# pruned: why each pruned task (by index) can never be planned or never counts
+# identical_groups: indices of the tasks that only differ by their id, in order
+presolved_type = collections.namedtuple('presolved_type', 'start_ranges pruned identical_groups')
+
+
+# Sorted, disjoint [first, last] start ranges of a task: free gaps of its calendar,
+# inside windows of its tags, within its delay bounds (and the last start of a
+# rescaled task)
+def task_start_ranges(interval_index, task, horizon):
+    first_start, last_start = interval_index.start, latest_end(task.due_date, task.max_due_date, horizon) - task.duration
+    if task.max_due_date != task.due_date:
+        first_start = task.due_date + (-(max_delay + 1) * (task.max_due_date - task.due_date)) // 100 + 1 - task.duration
+    if task.last_start is not None:
+        last_start = min(last_start, task.last_start)
+    return [
+        (max(first, first_start), min(last, last_start)) for first, last in interval_index.start_ranges(task.tags, task.duration)
+        if first <= last_start and last >= first_start
+    ]
+
+
+# Why a task can never be planned or never counts in the objectives, None otherwise
+def prune_reason(interval_index, task, start_ranges, raw_priority):
+    if any([tag not in interval_index.windows_by_tag for tag in task.tags]):
+        return 'noTagWindow'
+    if not interval_index.start_ranges(task.tags, task.duration):
+        return 'noFreeGap'
+    if not start_ranges:
+        return 'delayBounds'
+    # A task without raw priority adds nothing to either objective
+    if raw_priority <= 0:
+        return 'noImpact'
+    return None
+
+
+def presolve(problem, horizon, time_step):
+    interval_index = interval_indexes.get(problem.reserved_intervals, problem.reserved_tags, problem.start, horizon)
+    start_ranges = []
+    pruned = {}
+    groups = {}
+    for task_id, task in enumerate(problem.tasks):
+        ranges = task_start_ranges(interval_index, task, horizon)
+        reason = prune_reason(interval_index, task, ranges, math.floor(task.impact * 100 / (task.duration * time_step)))
+        if reason is not None:
+            pruned[task_id] = reason
+            ranges = []
+        else:
+            groups.setdefault((task.impact, task.duration, task.due_date, task.max_due_date, task.tags, task.last_start), []).append(task_id)
+        start_ranges.append(ranges)
+    return presolved_type(
+        start_ranges=start_ranges,
+        pruned=pruned,
+        identical_groups=[group for group in groups.values() if len(group) > 1]
+    )
@@ -0,0 +1,312 @@
+from dataclasses import dataclass
+import math
+import numbers
+
+
+@dataclass(slots=True, frozen=True)
+class Task:
+    id: object
+    impact: float
+    duration: int
+    due_date: int
+    max_due_date: int
+    tags: frozenset
+    # Latest start allowed by the request times of a rescaled task (see rescale_problem)
+    last_start: int = None
+
+
+@dataclass(slots=True, frozen=True)
+class ReservedInterval:
+    start: int
+    end: int
+
+
+@dataclass(slots=True, frozen=True)
+class ReservedTag:
+    start: int
+    end: int
+    tags: frozenset
+    is_transparent: bool
+
+
+# Everything schedule needs from a request, validated once
+@dataclass(slots=True, frozen=True)
+class Problem:
+    tasks: list
+    reserved_intervals: list
+    reserved_tags: list
+    start: int
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def read_int(item, field, default=None):
+    value = item.get(field)
+    if is_missing(value):
+        if default is None:
+            raise ValueError(f'Missing {field} in {item}')
+        return default
+    if isinstance(value, bool) or not isinstance(value, numbers.Real) or value != int(value):
+        raise ValueError(f'{field} should be an integer in {item}')
+    return int(value)
+
+
+def read_tags(item, field):
+    value = item.get(field)
+    if value is None:
+        return frozenset()
+    if not isinstance(value, (list, tuple, set, frozenset)) or not all([isinstance(tag, str) for tag in value]):
+        raise ValueError(f'{field} should be a list of strings in {item}')
+    return frozenset(value)
+
+
+def check_object(item):
+    if not isinstance(item, dict):
+        raise ValueError(f'Expected an object, got {item}')
+
+
+def read_task(item):
+    check_object(item)
+    if is_missing(item.get('id')):
+        raise ValueError(f'Missing id in {item}')
+    if isinstance(item['id'], bool) or not isinstance(item['id'], (str, numbers.Real)):
+        raise ValueError(f'id should be a string or a number in {item}')
+    impact = item.get('impact')
+    if is_missing(impact):
+        impact = 0
+    if isinstance(impact, bool) or not isinstance(impact, numbers.Real):
+        raise ValueError(f'impact should be a number in {item}')
+    duration = read_int(item, 'duration')
+    if duration <= 0:
+        raise ValueError(f'duration should be positive in {item}')
+    due_date = read_int(item, 'dueDate')
+    # A task without max due date cannot be delayed
+    max_due_date = read_int(item, 'maxDueDate', due_date)
+    if max_due_date < due_date:
+        raise ValueError(f'maxDueDate should not be before dueDate in {item}')
+    return Task(
+        id=item['id'],
+        impact=impact,
+        duration=duration,
+        due_date=due_date,
+        max_due_date=max_due_date,
+        tags=read_tags(item, 'tags')
+    )
+
+
+def read_reserved_interval(item):
+    check_object(item)
+    reserved_interval = ReservedInterval(start=read_int(item, 'start'), end=read_int(item, 'end'))
+    if reserved_interval.end < reserved_interval.start:
+        raise ValueError(f'end should not be before start in {item}')
+    return reserved_interval
+
+
+def read_reserved_tag(item):
+    check_object(item)
+    reserved_tag = ReservedTag(
+        start=read_int(item, 'start'),
+        end=read_int(item, 'end'),
+        tags=read_tags(item, 'tags'),
+        is_transparent=bool(item.get('isTransparent', False))
+    )
+    if reserved_tag.end < reserved_tag.start:
+        raise ValueError(f'end should not be before start in {item}')
+    return reserved_tag
+
+
+# Optional non-negative number of a request, default when missing
+def read_non_negative_number(data, field, default=None):
+    value = data.get(field)
+    if is_missing(value):
+        return default
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise ValueError(f'{field} should be a number')
+    if value < 0:
+        raise ValueError(f'{field} should not be negative')
+    return value
+
+
+# Solver budget of a request (timeLimitMs, numWorkers, relativeGap), as the keyword
+# arguments of solver_options_type. defaults holds the values of missing fields.
+def read_solver_limits(data, defaults):
+    num_workers = defaults.get('num_workers')
+    if not is_missing(data.get('numWorkers')):
+        num_workers = read_int(data, 'numWorkers')
+        if num_workers <= 0:
+            raise ValueError('numWorkers should be positive')
+    return {
+        "time_limit_ms": read_non_negative_number(data, 'timeLimitMs', defaults.get('time_limit_ms')),
+        "num_workers": num_workers,
+        "relative_gap": read_non_negative_number(data, 'relativeGap', defaults.get('relative_gap'))
+    }
+
+
+# Previous plan of an incremental request: task ids mapped to their previous
+# {start, end, isPresent}, end being optional
+def read_previous_plan(data):
+    previous_plan = data.get('previousPlan')
+    if previous_plan is None:
+        return None
+    if not isinstance(previous_plan, dict):
+        raise ValueError('previousPlan should map task ids to planned tasks')
+    for task_id, planned_task in previous_plan.items():
+        if not isinstance(planned_task, dict):
+            raise ValueError(f'planned task {task_id} should be an object in previousPlan')
+        start = read_int(planned_task, 'start')
+        if not is_missing(planned_task.get('end')) and read_int(planned_task, 'end') < start:
+            raise ValueError(f'end should not be before start in {planned_task}')
+        if not isinstance(planned_task.get('isPresent'), bool):
+            raise ValueError(f'isPresent should be a boolean in {planned_task}')
+    return previous_plan
+
+
+def read_changed_tasks(data):
+    changed_tasks = data.get('changedTasks')
+    if changed_tasks is None:
+        return None
+    if not isinstance(changed_tasks, list):
+        raise ValueError('changedTasks should be a list of task ids')
+    return changed_tasks
+
+
+def read_freeze_margin(data):
+    if is_missing(data.get('freezeMargin')):
+        return None
+    freeze_margin = read_int(data, 'freezeMargin')
+    if freeze_margin < 0:
+        raise ValueError('freezeMargin should not be negative')
+    return freeze_margin
+
+
+# Build a problem from the JSON body of a request
+def parse_problem(data):
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    for field in ('events', 'reservedIntervals', 'reservedTags', 'start'):
+        if field not in data:
+            raise ValueError(f'Missing {field}')
+    for field in ('events', 'reservedIntervals', 'reservedTags'):
+        if not isinstance(data[field], list):
+            raise ValueError(f'{field} should be a list')
+    return Problem(
+        tasks=[read_task(item) for item in data['events']],
+        reserved_intervals=[read_reserved_interval(item) for item in data['reservedIntervals']],
+        reserved_tags=[read_reserved_tag(item) for item in data['reservedTags']],
+        start=read_int(data, 'start')
+    )
+
+
+# Build a problem from pandas DataFrames (pandas is only needed by this adapter)
+def problem_from_dataframes(tasks, reserved_intervals, reserved_tags, start):
+    import pandas as pd
+
+    # Missing cells (NaN, pd.NA) become None, lists of tags are kept as they are
+    def records(dataframe):
+        return [
+            {field: value if isinstance(value, list) or not pd.isna(value) else None for field, value in record.items()}
+            for record in dataframe.to_dict('records')
+        ]
+
+    return parse_problem({
+        "events": records(tasks),
+        "reservedIntervals": records(reserved_intervals),
+        "reservedTags": records(reserved_tags),
+        "start": start
+    })
+
+
+# Integer division rounding towards zero, like the solver division constraint
+def truncated_division(numerator, denominator):
+    quotient = abs(numerator) // abs(denominator)
+    return quotient if (numerator >= 0) == (denominator > 0) else -quotient
+
+
+# Latest end a task can take: its delay cannot go below -100%, so a delayable
+# task ends a bit after its max due date at most
+def latest_end(due_date, max_due_date, horizon):
+    if max_due_date == due_date:
+        return horizon
+    return min((100 * due_date + 101 * (max_due_date - due_date) - 1) // 100, horizon)
+
+
+# Tell incremental callers which of the planned tasks they need to update: tasks
+# whose presence or start differs from previous_plan, and new tasks that are planned
+def mark_moved_tasks(planned_tasks, previous_plan):
+    for task_id, planned_task in planned_tasks.items():
+        previous_task = previous_plan.get(str(task_id))
+        if previous_task is None:
+            planned_task["moved"] = planned_task["isPresent"]
+        else:
+            planned_task["moved"] = planned_task["isPresent"] != bool(previous_task['isPresent']) or \
+                (planned_task["isPresent"] and planned_task["start"] != previous_task['start'])
+    return planned_tasks
+
+
+# Greatest step dividing every duration and every time relative to the start,
+# including the starts of the planned tasks of previous_plan (so that they can stay)
+def common_time_step(problem, previous_plan=None):
+    times = [task.duration for task in problem.tasks]
+    for task in problem.tasks:
+        times += [task.due_date - problem.start, task.max_due_date - problem.start]
+    for reserved in problem.reserved_intervals + problem.reserved_tags:
+        times += [reserved.start - problem.start, reserved.end - problem.start]
+    for planned_task in (previous_plan or {}).values():
+        if planned_task['isPresent']:
+            times.append(int(planned_task['start']) - problem.start)
+    return math.gcd(*times) or 1
+
+
+# Express the times of a problem in steps from its start. When the step does not
+# divide every time, the schedule of the rescaled problem stays valid: durations
+# are rounded up, reserved intervals are widened, tag windows are narrowed (the
+# edges of opaque ones are blocked) and delayable tasks get the last start their
+# request latest end allows.
+def rescale_problem(problem, step):
+    def floor_time(value):
+        return (value - problem.start) // step
+
+    def ceil_time(value):
+        return -((problem.start - value) // step)
+
+    horizon = max([task.max_due_date for task in problem.tasks], default=problem.start)
+    tasks = []
+    for task in problem.tasks:
+        due_date = floor_time(task.due_date)
+        max_due_date = floor_time(task.max_due_date)
+        last_start = None
+        # A task that can be delayed still can, but no later than its request times allow
+        # (rounded dates can let it end after them)
+        if task.max_due_date != task.due_date:
+            max_due_date = max(max_due_date, due_date + 1)
+            last_start = floor_time(latest_end(task.due_date, task.max_due_date, horizon) - task.duration)
+        tasks.append(Task(
+            id=task.id,
+            impact=task.impact,
+            duration=-(-task.duration // step),
+            due_date=due_date,
+            max_due_date=max_due_date,
+            tags=task.tags,
+            last_start=last_start
+        ))
+    reserved_intervals = [
+        ReservedInterval(start=floor_time(reserved_interval.start), end=ceil_time(reserved_interval.end))
+        for reserved_interval in problem.reserved_intervals
+    ]
+    reserved_tags = []
+    for reserved_tag in problem.reserved_tags:
+        window_start, window_end = ceil_time(reserved_tag.start), floor_time(reserved_tag.end)
+        reserved_tags.append(ReservedTag(
+            start=window_start,
+            end=max(window_end, window_start),
+            tags=reserved_tag.tags,
+            is_transparent=reserved_tag.is_transparent
+        ))
+        if not reserved_tag.is_transparent:
+            reserved_intervals += [
+                ReservedInterval(start=floor_time(reserved_tag.start), end=window_start),
+                ReservedInterval(start=window_end, end=ceil_time(reserved_tag.end))
+            ]
+    return Problem(tasks=tasks, reserved_intervals=reserved_intervals, reserved_tags=reserved_tags, start=0)
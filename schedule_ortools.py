@@ -1,76 +1,209 @@
 import collections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import json
+import logging
+import multiprocessing
 from ortools.sat.python import cp_model
-import pandas as pd
 import math
+import os
+import threading
+import time
+from greedy import greedy_schedule
+from presolve import max_delay, presolve
+from timeline import overlapping_groups
+from problem import Problem, common_time_step, mark_moved_tasks, problem_from_dataframes, rescale_problem, truncated_division
+
+logger = logging.getLogger(__name__)
 
 def invert_bit(bit):
     return 1 - bit
 
 task_type = collections.namedtuple('task_type', 'id start end is_present interval raw_priority opt_raw_priority priority opt_priority delay is_late')
 assigned_task_type = collections.namedtuple('assigned_task_type', 'start task duration priority delay is_present is_late')
-reserved_tag_interval = collections.namedtuple('reserved_tag_interval', 'interval tags is_transparent')
 
-def schedule(tasks, reserved_intervals, reserved_tags, start):
-    debug = False
+# Solver budget of a request: time_limit_ms covers the whole request (model build
+# and every stage). deterministic makes results reproducible: the search is
+# interleaved and the limit is spent as solver deterministic time instead of wall
+# time, which can take longer on a loaded machine.
+solver_options_type = collections.namedtuple('solver_options_type', 'time_limit_ms num_workers relative_gap deterministic', defaults=[None, None, None, False])
+
+
+# Lets another thread stop a schedule: stop() interrupts the running stage and
+# the next stages do not start. The search is stopped through its solution callback,
+# CpSolver.StopSearch does nothing in OR-Tools 9.5 (Solve never registers the search
+# it runs). A stop that comes before the search picked up the callback stops it at
+# its first solution.
+class SearchControl:
+    def __init__(self):
+        self.stopped = False
+        self.callback = None
+        self.lock = threading.Lock()
+
+    # Register the solution callback of the stage about to run, False when stopped already
+    def start(self, callback):
+        with self.lock:
+            self.callback = callback
+            return not self.stopped
+
+    def finish(self):
+        with self.lock:
+            self.callback = None
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.callback is not None:
+                self.callback.StopSearch()
+
+
+# Report each improving solution of a stage to on_solution(stage name, objective, tasks)
+class SolutionCallback(cp_model.CpSolverSolutionCallback):
+    def __init__(self, name, all_tasks, on_solution, search_control):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.name = name
+        self.all_tasks = all_tasks
+        self.on_solution = on_solution
+        self.search_control = search_control
+
+    def on_solution_callback(self):
+        if self.search_control is not None and self.search_control.stopped:
+            self.StopSearch()
+            return
+        if self.on_solution is not None:
+            self.on_solution(self.name, self.ObjectiveValue(), {
+                v.id: {
+                    "start": self.Value(v.start),
+                    "isLate": bool(self.Value(v.is_late)),
+                    "isPresent": bool(self.Value(v.is_present)),
+                    "end": self.Value(v.end),
+                    "priority": self.Value(v.priority),
+                    "delay": self.Value(v.delay)
+                } for v in self.all_tasks.values()
+            })
+
+
+# Create a solver with what is left of the request budget
+def create_solver(solver_options, started_at, stages):
+    solver = cp_model.CpSolver()
+    if solver_options.time_limit_ms is not None:
+        if solver_options.deterministic:
+            used_time = sum([stage["deterministicTime"] for stage in stages])
+            solver.parameters.max_deterministic_time = max(solver_options.time_limit_ms / 1000 - used_time, 0)
+        else:
+            solver.parameters.max_time_in_seconds = max(solver_options.time_limit_ms / 1000 - (time.perf_counter() - started_at), 0)
+    if solver_options.num_workers is not None:
+        solver.parameters.num_search_workers = solver_options.num_workers
+    if solver_options.relative_gap is not None:
+        solver.parameters.relative_gap_limit = solver_options.relative_gap
+    if solver_options.deterministic:
+        solver.parameters.interleave_search = True
+    return solver
+
+
+# Solve the model and report the stage (status, objective, best bound, wall time, search statistics)
+def solve_stage(model, name, solver_options, started_at, stages, callback=None, search_control=None):
+    solver = create_solver(solver_options, started_at, stages)
+    stage_started_at = time.perf_counter()
+    solved = search_control is None or search_control.start(callback)
+    status = solver.Solve(model, callback) if solved else cp_model.UNKNOWN
+    if search_control is not None:
+        search_control.finish()
+    found = status == cp_model.OPTIMAL or status == cp_model.FEASIBLE
+    if status != cp_model.OPTIMAL and search_control is not None and search_control.stopped:
+        status_name = 'CANCELLED'
+    elif status == cp_model.UNKNOWN and solver_options.time_limit_ms is not None:
+        status_name = 'TIMEOUT'
+    else:
+        status_name = solver.StatusName(status)
+    stages.append({
+        "name": name,
+        "status": status_name,
+        "objective": solver.ObjectiveValue() if found else None,
+        "bestBound": solver.BestObjectiveBound() if found else None,
+        "wallTime": time.perf_counter() - stage_started_at,
+        "deterministicTime": solver.ResponseProto().deterministic_time if solved else 0,
+        "branches": solver.NumBranches() if solved else 0,
+        "conflicts": solver.NumConflicts() if solved else 0
+    })
+    logger.debug('%s', json.dumps(dict(stages[-1], event='stage')))
+    return solver, status
+
+
+# Linear equivalent of AddDivisionEquality(target, numerator, denominator) for a
+# positive constant denominator: the quotient is rounded down when the numerator
+# is positive and up when it is negative
+def add_linear_division(model, target, numerator, denominator, name):
+    is_negative = model.NewBoolVar(name)
+    model.Add(numerator < 0).OnlyEnforceIf(is_negative)
+    model.Add(numerator >= 0).OnlyEnforceIf(is_negative.Not())
+    model.Add(denominator * target <= numerator).OnlyEnforceIf(is_negative.Not())
+    model.Add(numerator <= denominator * target + denominator - 1).OnlyEnforceIf(is_negative.Not())
+    model.Add(denominator * target - denominator + 1 <= numerator).OnlyEnforceIf(is_negative)
+    model.Add(numerator <= denominator * target).OnlyEnforceIf(is_negative)
+
+
+# Whether a task can stay where the previous plan put it without breaking its
+# domain or its delay bounds
+def fits_previous_start(previous_start, duration, start_ranges, due_date, max_due_date, horizon, max_delay):
+    if not any([first <= previous_start <= last for first, last in start_ranges]):
+        return False
+    end = previous_start + duration
+    if end > horizon:
+        return False
+    if max_due_date != due_date:
+        delay = truncated_division((due_date - end) * 100, max_due_date - due_date)
+        return -100 <= delay <= max_delay
+    return True
+
+
+# Build and solve one CP-SAT model for all tasks of a problem (see schedule_problem),
+# whose times are counted in steps of time_step
+# on_solution and search_control see schedule_problem, times given to on_solution are steps.
+def solve_problem(problem, horizon, time_step, objective, formulation, solver_options, previous_plan, changed_task_ids, freeze_margin,
+                  on_solution=None, search_control=None):
+    # Details of the model and of the solution are only logged at debug level
+    debug = logger.isEnabledFor(logging.DEBUG)
+    started_at = time.perf_counter()
 
     if debug:
-        print('************ NEW SCHEDULE **************')
-        print('tasks', tasks)
-        print('reserved_intervals', reserved_intervals)
-        print('reserved_tags', reserved_tags)
-        print('start', start)
-    
-    if not len(tasks):
-        return {
-            "found": True,
-            "tasks": []
-        }
-    
-    # cast dates to int64
-    tasks['maxDueDate'] = tasks['maxDueDate'].astype('Int64')
-    tasks['dueDate'] = tasks['dueDate'].astype('Int64')
-    durations = list(tasks["duration"])
-    impacts = list(tasks["impact"].fillna(0))
-    dueDates = list(tasks['dueDate'])
-    maxDueDates = list(tasks['maxDueDate'])
-    tags = list(tasks['tags'])
-
-    # Horizon is the greatest due date
-    horizon = tasks['maxDueDate'].max()
-    # Max raw priority is the greatest impact*100/duration
-    max_raw_priority = math.floor(max([impact*100/durations[task_id] for task_id, impact in enumerate(impacts)]))
-    # Set maximum delay in %
-    max_delay = 10000
+        logger.debug('************ NEW SCHEDULE **************')
+        logger.debug('problem %s', problem)
+
+    start = problem.start
+    durations = [task.duration for task in problem.tasks]
+    impacts = [task.impact for task in problem.tasks]
+    dueDates = [task.due_date for task in problem.tasks]
+    maxDueDates = [task.max_due_date for task in problem.tasks]
+    tags = [task.tags for task in problem.tasks]
+    ids = [task.id for task in problem.tasks]
+
+    # Max raw priority is the greatest impact*100/duration (duration in request time units)
+    max_raw_priority = math.floor(max([impact*100/(durations[task_id]*time_step) for task_id, impact in enumerate(impacts)]))
 
     # Create the model.
     model = cp_model.CpModel()
 
     all_tasks = {}
 
-    # Create vars for all reserved tag intervals
-    reserved_tag_intervals = []
-    for index, row in reserved_tags.iterrows():
-        reserved_tag_intervals.append(reserved_tag_interval(
-                tags = row['tags'],
-                is_transparent = row['isTransparent'],
-                interval = model.NewIntervalVar(row['start'], row['end'] - row['start'], row['end'], f'reserved_tag_interval_{index}')
-            )
-        )
-
-    # Create vars for all reserved event intervals
-    reserved_event_intervals = []
-    for index, row in reserved_intervals.iterrows():
-        reserved_event_intervals.append(model.NewIntervalVar(row['start'], row['end'] - row['start'], row['end'], f'reserved_event_interval_{index}'))
+    # Start ranges of the tasks, and the tasks that are never planned
+    presolved = presolve(problem, horizon, time_step)
+    start_ranges_by_task = dict(enumerate(presolved.start_ranges))
 
-    # Create vars for all tasks
+    # Create vars for all tasks but the pruned ones
     for task_id, duration in enumerate(list(durations)):
-        if (debug):
-            print('*PROCESSING TASK WITH ID ' + tasks.iloc[task_id]['id'])
+        if debug:
+            logger.debug('*PROCESSING TASK WITH ID %s', ids[task_id])
+        if task_id in presolved.pruned:
+            if debug:
+                logger.debug('Task is pruned: %s', presolved.pruned[task_id])
+            continue
         suffix = '_%i' % (task_id)
-        # Task starts between start and horizon
-        start_var = model.NewIntVar(start, horizon - duration, 'start' + suffix)
-        # Task ends between start and horizon
-        end_var = model.NewIntVar(start, horizon, 'end' + suffix)
+        # Task starts between start and horizon, inside compatible tag windows, outside of reserved intervals it cannot overlap
+        # and within its delay bounds
+        start_ranges = start_ranges_by_task[task_id]
+        start_var = model.NewIntVarFromDomain(cp_model.Domain.FromIntervals(start_ranges), 'start' + suffix)
+        end_var = model.NewIntVarFromDomain(cp_model.Domain.FromIntervals([(first + duration, last + duration) for first, last in start_ranges]), 'end' + suffix)
         # Task can be present or not
         is_present_var = model.NewBoolVar('is_present' + suffix)
         # Task can be late or on time
@@ -78,78 +211,48 @@ def schedule(tasks, reserved_intervals, reserved_tags, start):
         # Task is modelized by an interval
         interval_var = model.NewOptionalIntervalVar(start_var, duration, end_var, is_present_var, 'interval' + suffix)
         # Task initial priority is impact per duration
-        raw_priority = math.floor(impacts[task_id]*100/duration)
+        raw_priority = math.floor(impacts[task_id]*100/(duration*time_step))
         if debug:
-            print('raw_priority', raw_priority)
+            logger.debug('raw_priority %s', raw_priority)
         # Initial priority should be 0 if event is not present
         opt_raw_priority_var = model.NewIntVar(0, max_raw_priority, 'raw_priority' + suffix)
-        model.AddMultiplicationEquality(opt_raw_priority_var, [raw_priority, is_present_var])
-        if pd.notna(maxDueDates[task_id]) and maxDueDates[task_id] != dueDates[task_id]:
+        if formulation == 'linear':
+            model.Add(opt_raw_priority_var == raw_priority * is_present_var)
+        else:
+            model.AddMultiplicationEquality(opt_raw_priority_var, [raw_priority, is_present_var])
+        if maxDueDates[task_id] != dueDates[task_id]:
             # Create delay var
             delay_var = model.NewIntVar(-100, max_delay, 'delay' + suffix)
-            model.AddDivisionEquality(delay_var, (dueDates[task_id] - end_var)*100, maxDueDates[task_id] - dueDates[task_id])
+            if formulation == 'linear':
+                add_linear_division(model, delay_var, (dueDates[task_id] - end_var)*100, maxDueDates[task_id] - dueDates[task_id], 'ends_after_due_date' + suffix)
+            else:
+                model.AddDivisionEquality(delay_var, (dueDates[task_id] - end_var)*100, maxDueDates[task_id] - dueDates[task_id])
             # Final priority is initial priority x delay
             if debug:
-                print('Task can be delayed, priority is raw_priority x delay')
+                logger.debug('Task can be delayed, priority is raw_priority x delay')
             priority_var = model.NewIntVar(-max_raw_priority * 100, max_raw_priority * max_delay, 'priority' + suffix)
-            model.AddMultiplicationEquality(priority_var, [raw_priority, delay_var])
+            if formulation == 'linear':
+                model.Add(priority_var == raw_priority * delay_var)
+            else:
+                model.AddMultiplicationEquality(priority_var, [raw_priority, delay_var])
         else:
             # Create 0 delay var if due date is max due date
             delay_var = model.NewConstant(0)
             # Final priority is initial priority
             priority_var = model.NewIntVar(-max_raw_priority, max_raw_priority, 'priority' + suffix)
+            model.Add(priority_var == raw_priority)
             if debug:
-                print('Task cannot be delayed, priority is raw_priority')
+                logger.debug('Task cannot be delayed, priority is raw_priority')
         # Priority should be 0 if task is not present
         opt_priority_var = model.NewIntVar(-max_raw_priority * 100, max_raw_priority * max_delay, 'opt_priority' + suffix)
-        model.AddMultiplicationEquality(opt_priority_var, [priority_var, is_present_var])
-        # Prevent reserved intervals from overlapping
-        incompatible_intervals: list[cp_model.IntervalVar] = []
-        compatible_intervals_by_tag: dict[str, list[cp_model.IntervalVar]] = {}
-        # If task has no tag, all opaque reserved tag intervals are incompatible
-        if not(len(tags[task_id])):
-            incompatible_intervals += [reserved_interval.interval for reserved_interval in reserved_tag_intervals if not(reserved_interval.is_transparent)]
-        # Process each task tag
-        for i, tag in enumerate(tags[task_id]):
-            if debug:
-                print('**PROCESSING TASK TAG ' + tag + '**')
-            for j, reserved_interval in enumerate(reserved_tag_intervals):
-                # If tag matches, add interval with tag as compatible and remove duration of task
-                if tag in reserved_interval.tags:
-                    if (not(tag in compatible_intervals_by_tag)):
-                        compatible_intervals_by_tag[tag] = []
-                    compatible_intervals_by_tag[tag] += [model.NewIntervalVar(reserved_interval.interval.StartExpr(), reserved_interval.interval.EndExpr() - duration - reserved_interval.interval.StartExpr(), reserved_interval.interval.EndExpr() - duration, 'compatible_interval' + suffix + '_' + tag + '_' + str(j))]
-                # Else add interval with tag as incompatible if it is not transparent
-                elif not reserved_interval.is_transparent:
-                    incompatible_intervals += [reserved_interval.interval]
-            # If there are some compatible intervals
-            if tag in compatible_intervals_by_tag:
-                start_in_interval_vars = []
-                # Each task tag must fill a compatible interval
-                for index, compatible_interval in enumerate(compatible_intervals_by_tag[tag]):
-                    if debug:
-                        print('Compatible interval found', compatible_interval)
-                    included_in_interval_var = model.NewBoolVar('start_in_interval' + suffix + '_' + tag + '_' + str(index))
-                    if debug:
-                        print('Task must start after ', compatible_interval.StartExpr(), ' and end before ', compatible_interval.EndExpr(), 'if this interval is selected')
-                    model.Add(start_var >= compatible_interval.StartExpr()).OnlyEnforceIf(included_in_interval_var)
-                    model.Add(end_var <= compatible_interval.EndExpr()).OnlyEnforceIf(included_in_interval_var)
-                    start_in_interval_vars.append(included_in_interval_var)
-                model.AddAtLeastOne(start_in_interval_vars)
-            else:
-                if debug:
-                    print('Task cannot be present', compatible_intervals_by_tag)
-                model.Add(is_present_var == 0)
-        # Add all opaque reserved event intervals as incompatible
-        incompatible_intervals += reserved_event_intervals
-        # Task can't overlap incompatible intervals
-        if debug:
-            print('Incompatible intervals found', incompatible_intervals)
-        for incompatible_interval in incompatible_intervals:
-            model.AddNoOverlap([incompatible_interval, interval_var])
+        if formulation == 'linear':
+            model.Add(opt_priority_var == priority_var).OnlyEnforceIf(is_present_var)
+            model.Add(opt_priority_var == 0).OnlyEnforceIf(is_present_var.Not())
+        else:
+            model.AddMultiplicationEquality(opt_priority_var, [priority_var, is_present_var])
         # Add task vars to all_tasks
         all_tasks[task_id] = task_type(
-            id=tasks.iloc[task_id]['id'],
+            id=ids[task_id],
             start=start_var,
             end=end_var,
             interval=interval_var,
@@ -162,69 +265,611 @@ def schedule(tasks, reserved_intervals, reserved_tags, start):
             is_late=is_late_var
         )
     
+    # Start from the previous plan of an incremental request
+    previous_plan = {str(task_id): planned_task for task_id, planned_task in (previous_plan or {}).items()}
+    if previous_plan:
+        changed_task_ids = set([str(task_id) for task_id in (changed_task_ids or [])])
+        for task_id, v in all_tasks.items():
+            planned_task = previous_plan.get(str(v.id))
+            if planned_task is None or ('end' in planned_task and planned_task['end'] - planned_task['start'] != durations[task_id]):
+                changed_task_ids.add(str(v.id))
+        # Changed tasks may free their previous placement and take any place of their
+        # feasible window, which ends at the max due date when they can be delayed
+        changed_spans = []
+        for task_id, v in all_tasks.items():
+            if str(v.id) in changed_task_ids:
+                if start_ranges_by_task[task_id]:
+                    span_end = start_ranges_by_task[task_id][-1][1] + durations[task_id]
+                    if maxDueDates[task_id] != dueDates[task_id]:
+                        span_end = min(span_end, int(maxDueDates[task_id]))
+                    changed_spans.append((start_ranges_by_task[task_id][0][0], span_end))
+                planned_task = previous_plan.get(str(v.id))
+                if planned_task is not None and planned_task['isPresent']:
+                    changed_spans.append((planned_task['start'], planned_task['start'] + durations[task_id]))
+        for task_id, v in all_tasks.items():
+            planned_task = previous_plan.get(str(v.id))
+            if planned_task is None:
+                continue
+            previous_start = int(planned_task['start'])
+            model.AddHint(v.start, previous_start)
+            model.AddHint(v.is_present, bool(planned_task['isPresent']))
+            if (freeze_margin is not None and planned_task['isPresent'] and str(v.id) not in changed_task_ids
+                    and all([previous_start + durations[task_id] + freeze_margin <= span_start or span_end + freeze_margin <= previous_start
+                             for span_start, span_end in changed_spans])
+                    and fits_previous_start(previous_start, durations[task_id], start_ranges_by_task[task_id], dueDates[task_id], maxDueDates[task_id], horizon, max_delay)):
+                if debug:
+                    logger.debug('Task is frozen at its previous start %s', v.id)
+                model.Add(v.start == previous_start)
+                model.Add(v.is_present == 1)
+
+    # Identical tasks are interchangeable, plan them in their order: the order of their
+    # previous starts, so that an unchanged plan stays as it is (unless tasks frozen at
+    # their previous start could contradict it)
+    def previous_order(task_id):
+        planned_task = previous_plan.get(str(ids[task_id]))
+        if planned_task is None or not planned_task['isPresent']:
+            return (1, 0, task_id)
+        return (0, int(planned_task['start']), task_id)
+
+    if not (previous_plan and freeze_margin is not None):
+        for group in presolved.identical_groups:
+            if previous_plan:
+                group = sorted(group, key=previous_order)
+            for task_id, next_task_id in zip(group, group[1:]):
+                model.AddImplication(all_tasks[next_task_id].is_present, all_tasks[task_id].is_present)
+                model.Add(all_tasks[task_id].end <= all_tasks[next_task_id].start).OnlyEnforceIf(all_tasks[next_task_id].is_present)
+
     # Prevent all tasks from overlapping
     model.AddNoOverlap([all_tasks[task].interval for task in all_tasks])
 
-    # Maximize raw priority
+    # Raw priority is optimized first, then priority
     total_raw_priority_var = model.NewIntVar(0, sum([all_tasks[task_id].raw_priority for task_id in all_tasks]), name='total_raw_priority')
     model.Add(total_raw_priority_var == sum([all_tasks[task_id].opt_raw_priority for task_id in all_tasks]))
-    model.Maximize(total_raw_priority_var)
+    min_total_priority = -sum([all_tasks[task_id].raw_priority * 100 for task_id in all_tasks])
+    max_total_priority = sum([all_tasks[task_id].raw_priority * max_delay for task_id in all_tasks])
+    total_priority_var = model.NewIntVar(min_total_priority, max_total_priority, name='total_priority')
+    model.Add(total_priority_var == sum([all_tasks[task_id].opt_priority for task_id in all_tasks]))
 
-    # Creates the solver and solve.
-    solver = cp_model.CpSolver()
-    status = solver.Solve(model)
-
-    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        # Hint (speed up solving)
-        for k, v in all_tasks.items():
-            model.Add(v.is_present == solver.Value(v.is_present))
-
-        # Maximize priority (and constraint previous objective)
-        model.Add(total_raw_priority_var == round(solver.ObjectiveValue()))  # use <= or >= if not optimal
-        total_priority_var = model.NewIntVar(
-            -sum([all_tasks[task_id].raw_priority * 100 for task_id in all_tasks]),
-            sum([all_tasks[task_id].raw_priority * max_delay for task_id in all_tasks]),
-            name='total_priority'
-        )
-        model.Add(total_priority_var == sum([all_tasks[task_id].opt_priority for task_id in all_tasks]))
-        model.Maximize(total_priority_var)
+    # One unit of raw priority outweighs the whole range of priority, so a single
+    # weighted objective is lexicographic (if it fits in the solver integers)
+    priority_weight = max_total_priority - min_total_priority + 1
+    if objective == 'weighted' and sum([all_tasks[task_id].raw_priority for task_id in all_tasks]) * priority_weight + max_total_priority >= 2 ** 62:
+        if debug:
+            logger.debug('Weighted objective would overflow, falling back to hint')
+        objective = 'hint'
+
+    # Size of the model given to the first stage, and time spent building it
+    model_stats = {
+        "variables": len(model.Proto().variables),
+        "constraints": len(model.Proto().constraints),
+        "buildTime": time.perf_counter() - started_at
+    }
+
+    def stage_callback(name):
+        if on_solution is None and search_control is None:
+            return None
+        return SolutionCallback(name, all_tasks, on_solution, search_control)
+
+    # Keep the last solver that found a solution, so a stage running out of time
+    # still returns the best schedule found so far
+    stages = []
+    solver = None
 
-        solver.Solve(model)
+    if not all_tasks:
+        # Every task is pruned, there is nothing to solve
+        pass
+    elif objective == 'weighted':
+        model.Maximize(total_raw_priority_var * priority_weight + total_priority_var)
+        stage_solver, status = solve_stage(model, 'weighted', solver_options, started_at, stages, stage_callback('weighted'), search_control)
+        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+            solver = stage_solver
+    else:
+        # Maximize raw priority
+        model.Maximize(total_raw_priority_var)
+        stage_solver, status = solve_stage(model, 'rawPriority', solver_options, started_at, stages, stage_callback('rawPriority'), search_control)
 
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            print(f'Optimal Priority: {solver.ObjectiveValue()}')
-            for task_id, duration in enumerate(list(durations)):
-                print(assigned_task_type(
+            solver = stage_solver
+            if objective == 'hint':
+                # Warm start stage 2 from the whole stage 1 solution (constants are shared, hint them once)
+                model.Proto().ClearField('solution_hint')
+                hinted_vars = {total_priority_var.Index(): total_priority_var}
+                for k, v in all_tasks.items():
+                    for var in [v.start, v.end, v.is_present, v.opt_raw_priority, v.priority, v.opt_priority, v.delay]:
+                        hinted_vars[var.Index()] = var
+                for var in hinted_vars.values():
+                    model.AddHint(var, solver.Value(var))
+            else:
+                # Fix presence from stage 1 (shrinks stage 2 search)
+                for k, v in all_tasks.items():
+                    model.Add(v.is_present == solver.Value(v.is_present))
+
+            # Maximize priority (and constraint previous objective)
+            if status == cp_model.OPTIMAL:
+                model.Add(total_raw_priority_var == round(solver.ObjectiveValue()))
+            else:
+                model.Add(total_raw_priority_var >= round(solver.ObjectiveValue()))
+            model.Maximize(total_priority_var)
+
+            stage_solver, status = solve_stage(model, 'priority', solver_options, started_at, stages, stage_callback('priority'), search_control)
+            if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+                solver = stage_solver
+
+    pruned = {ids[task_id]: reason for task_id, reason in presolved.pruned.items()}
+    if solver is not None or not all_tasks:
+        if debug and solver is not None:
+            logger.debug('Optimal Priority: %s', solver.Value(total_priority_var))
+            for task_id in all_tasks:
+                logger.debug('%s', assigned_task_type(
                     start=solver.Value(all_tasks[task_id].start),
                     task=task_id,
-                    duration=duration,
+                    duration=durations[task_id],
                     priority=solver.Value(all_tasks[task_id].priority),
                     is_present=solver.Value(all_tasks[task_id].is_present),
                     delay=solver.Value(all_tasks[task_id].delay),
                     is_late=solver.Value(all_tasks[task_id].is_late)
                 ))
-            return {
-                "found": True,
-                "tasks": {
-                    v.id: {
-                        "start": solver.Value(v.start),
-                        "isLate": bool(solver.Value(v.is_late)),
-                        "isPresent": bool(solver.Value(v.is_present)),
-                        "end": solver.Value(v.end),
-                        "priority": solver.Value(v.priority),
-                        "delay": solver.Value(v.delay)
-                    } for k, v in all_tasks.items()
-                }
+        planned_tasks = {
+            v.id: {
+                "start": solver.Value(v.start),
+                "isLate": bool(solver.Value(v.is_late)),
+                "isPresent": bool(solver.Value(v.is_present)),
+                "end": solver.Value(v.end),
+                "priority": solver.Value(v.priority),
+                "delay": solver.Value(v.delay)
+            } for k, v in all_tasks.items()
+        }
+        for task_id in presolved.pruned:
+            planned_tasks[ids[task_id]] = {
+                "start": start,
+                "isLate": False,
+                "isPresent": False,
+                "end": start + durations[task_id],
+                "priority": 0,
+                "delay": 0
             }
-        else:
-            print('No solution found (stage 2)')
+        return {
+            "found": True,
+            "status": 'OPTIMAL' if all([stage["status"] == 'OPTIMAL' for stage in stages]) else 'FEASIBLE',
+            "stages": stages,
+            "model": model_stats,
+            "pruned": pruned,
+            "tasks": planned_tasks
+        }
+    else:
+        logger.info('No solution found')
+        return {
+            "found": False,
+            "status": stages[-1]["status"],
+            "stages": stages,
+            "model": model_stats,
+            "pruned": pruned,
+            "tasks": []
+        }
+
+
+# Tasks only interact through the no-overlap constraint, so groups of tasks whose
+# occupied time ranges cannot overlap, even through other tasks, are independent
+# problems: long reserved intervals, days no task window crosses and disjoint tag
+# windows split them. Objectives are sums over tasks, so merging the optimal
+# schedule of each problem gives an optimal schedule of the whole problem.
+# Pruned tasks (see presolve) occupy nothing, they make a single problem.
+def split_problem(problem, horizon, time_step):
+    presolved = presolve(problem, horizon, time_step)
+    occupied_ranges = [
+        [(first, last + task.duration) for first, last in start_ranges] for task, start_ranges in zip(problem.tasks, presolved.start_ranges)
+    ]
+    groups = overlapping_groups(occupied_ranges)
+    pruned_group = [task_id for group in groups for task_id in group if task_id in presolved.pruned]
+    groups = [group for group in groups if group[0] not in presolved.pruned] + ([pruned_group] if pruned_group else [])
+    return [
+        Problem(
+            tasks=[problem.tasks[task_id] for task_id in group],
+            reserved_intervals=problem.reserved_intervals,
+            reserved_tags=problem.reserved_tags,
+            start=problem.start
+        ) for group in groups
+    ]
+
+
+# Solve independent problems one after the other. The time budget is shared in
+# proportion to their number of tasks, time a problem does not use goes to the next ones.
+def solve_components(problems, horizon, time_step, objective, formulation, solver_options, previous_plan, changed_task_ids, freeze_margin,
+                     on_solution=None, search_control=None):
+    started_at = time.perf_counter()
+    used_time = 0
+    results = []
+    for problem_id, problem in enumerate(problems):
+        component_solver_options = solver_options
+        if solver_options.time_limit_ms is not None:
+            if solver_options.deterministic:
+                time_left_ms = solver_options.time_limit_ms - used_time * 1000
+            else:
+                time_left_ms = solver_options.time_limit_ms - (time.perf_counter() - started_at) * 1000
+            share = len(problem.tasks) / sum([len(next_problem.tasks) for next_problem in problems[problem_id:]])
+            component_solver_options = solver_options._replace(time_limit_ms=max(time_left_ms * share, 0))
+        result = solve_problem(problem, horizon, time_step, objective, formulation, component_solver_options, previous_plan, changed_task_ids, freeze_margin,
+                               on_solution, search_control)
+        used_time += sum([stage["deterministicTime"] for stage in result["stages"]])
+        results.append(result)
+    return results
+
+
+# Merge the stages of independent problems: objectives and times add up, a stage
+# is only OPTIMAL if it is for every problem
+def merge_stages(results):
+    stages = {}
+    for result in results:
+        for stage in result["stages"]:
+            if stage["name"] not in stages:
+                stages[stage["name"]] = dict(stage)
+                continue
+            merged_stage = stages[stage["name"]]
+            if merged_stage["status"] == 'OPTIMAL':
+                merged_stage["status"] = stage["status"]
+            for field in ("objective", "bestBound"):
+                merged_stage[field] = None if merged_stage[field] is None or stage[field] is None else merged_stage[field] + stage[field]
+            for field in ("wallTime", "deterministicTime", "branches", "conflicts"):
+                merged_stage[field] += stage[field]
+    return list(stages.values())
+
+
+# Merge the results of independent problems. A problem whose search stopped before
+# any solution (time limit, cancelled job) plans none of its tasks, the other
+# problems keep their schedule.
+def merge_results(problem, results):
+    stages = merge_stages(results)
+    model_stats = {
+        field: sum([result["model"][field] for result in results]) for field in ("variables", "constraints", "buildTime")
+    }
+    pruned = {}
+    for result in results:
+        pruned.update(result["pruned"])
+    unsolved_results = [result for result in results if not result["found"]]
+    for result in unsolved_results:
+        if len(unsolved_results) == len(results) or result["status"] not in ('TIMEOUT', 'CANCELLED', 'UNKNOWN'):
             return {
                 "found": False,
+                "status": result["status"],
+                "stages": stages,
+                "model": model_stats,
+                "components": len(results),
+                "pruned": pruned,
                 "tasks": []
             }
-    else:
-        print('No solution found (stage 1)')
+    planned_tasks = {}
+    for result in results:
+        if result["found"]:
+            planned_tasks.update(result["tasks"])
+    for task in problem.tasks:
+        if task.id not in planned_tasks:
+            planned_tasks[task.id] = {
+                "start": problem.start,
+                "isLate": False,
+                "isPresent": False,
+                "end": problem.start + task.duration,
+                "priority": 0,
+                "delay": 0
+            }
+    return {
+        "found": True,
+        "status": 'OPTIMAL' if all([result["status"] == 'OPTIMAL' for result in results]) else 'FEASIBLE',
+        "stages": stages,
+        "model": model_stats,
+        "components": len(results),
+        "pruned": pruned,
+        "tasks": {task.id: planned_tasks[task.id] for task in problem.tasks}
+    }
+
+
+# Processes solving independent problems, started on first use and kept for the
+# next requests. They are spawned, forking a threaded server is not safe.
+process_pool = None
+process_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers):
+    global process_pool
+    with process_pool_lock:
+        if process_pool is None:
+            process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=initialize_worker)
+        return process_pool
+
+
+# Run by each process of the pool as it starts: the process imports this module,
+# and with it the solver, to run it
+def initialize_worker():
+    logger.debug('Worker process %s started', os.getpid())
+
+
+def worker_pid():
+    return os.getpid()
+
+
+# Start every process of the pool ahead of the first request (each one runs
+# initialize_worker, even if it gets none of the worker_pid calls). Returns the
+# processes that ran one.
+def start_process_pool(max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    pool = get_process_pool(max_workers)
+    return set([future.result() for future in [pool.submit(worker_pid) for _ in range(max_workers)]])
+
+
+# Forget a pool whose worker died, the next request starts a new one
+def discard_process_pool(pool):
+    global process_pool
+    with process_pool_lock:
+        if process_pool is pool:
+            process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Split problems between at most max_workers chunks of about the same number of tasks
+def balance_chunks(problems, max_workers):
+    chunks = [[] for _ in range(min(max_workers, len(problems)))]
+    chunk_sizes = [0] * len(chunks)
+    for problem_id in sorted(range(len(problems)), key=lambda problem_id: -len(problems[problem_id].tasks)):
+        chunk = chunk_sizes.index(min(chunk_sizes))
+        chunks[chunk].append(problem_id)
+        chunk_sizes[chunk] += len(problems[problem_id].tasks)
+    return chunks
+
+
+# Express the times of a plan in steps from the start, like rescale_problem
+def rescale_plan(plan, start, step):
+    rescaled_plan = {}
+    for task_id, planned_task in plan.items():
+        planned_start = (int(planned_task['start']) - start) // step
+        rescaled_plan[task_id] = dict(planned_task, start=planned_start)
+        if 'end' in planned_task:
+            rescaled_plan[task_id]['end'] = planned_start - (-(planned_task['end'] - planned_task['start']) // step)
+    return rescaled_plan
+
+
+# Express rescaled planned tasks back in request times. With a step, the delay and
+# priority of planned tasks are the ones of their end in request times.
+def unscale_tasks(planned_tasks, problem, step):
+    tasks = {task.id: task for task in problem.tasks}
+    for task_id, planned_task in planned_tasks.items():
+        task = tasks[task_id]
+        planned_task["start"] = problem.start + planned_task["start"] * step
+        planned_task["end"] = planned_task["start"] + task.duration
+        if step > 1 and planned_task["isPresent"]:
+            raw_priority = math.floor(task.impact * 100 / task.duration)
+            if task.max_due_date != task.due_date:
+                planned_task["delay"] = truncated_division((task.due_date - planned_task["end"]) * 100, task.max_due_date - task.due_date)
+                planned_task["priority"] = raw_priority * planned_task["delay"]
+            else:
+                planned_task["priority"] = raw_priority
+    return planned_tasks
+
+
+def unscale_result(result, problem, step):
+    if result["tasks"]:
+        unscale_tasks(result["tasks"], problem, step)
+    return dict(result, timeStep=step)
+
+
+# Moved flags of an unscaled result, compared with the previous plan in request
+# times: a previous start rounded to the step is a move
+def mark_request_moved_tasks(result, previous_plan):
+    if previous_plan and result["tasks"]:
+        mark_moved_tasks(result["tasks"], {str(task_id): planned_task for task_id, planned_task in previous_plan.items()})
+    return result
+
+
+# objective is 'two_stage' (maximize raw priority, fix presence, then maximize priority),
+# 'hint' (same stages, stage 2 warm started instead of fixed) or 'weighted' (single solve).
+# previous_plan maps task ids to their previous {start, end, isPresent}: it warm starts
+# the solver and, with freeze_margin, tasks planned further than freeze_margin from
+# every changed task (changed_task_ids, new tasks or tasks whose duration changed)
+# of their independent problem keep their previous start.
+# With decompose, independent problems are solved separately, concurrently in up to
+# max_workers processes (one per CPU by default).
+# Times are counted in steps of time_step from the start, the greatest step dividing
+# every time and previous start by default (a larger step rounds times and durations, see
+# rescale_problem, moved then compares request times). With
+# coarse_time_step, half of the budget goes to a schedule on that coarser grid, which
+# then warm starts the solve (unless previous_plan already does).
+# formulation is 'nonlinear' (delay and priorities as division and multiplication
+# constraints) or 'linear' (the same values as linear constraints, which the solver
+# relaxation handles better).
+# on_solution(stage name, objective, tasks) receives each improving solution of an
+# independent problem (its tasks only, in request times) and search_control (a
+# SearchControl) lets another thread stop the schedule. Independent problems are then
+# solved in the calling thread.
+# mode is 'cpsat' (the solver), 'greedy' (greedy_schedule alone, in milliseconds) or
+# 'hybrid' (the greedy schedule warm starts the solver, unless previous_plan or
+# coarse_time_step already does, and is kept for independent problems the solver
+# found nothing for in time).
+def schedule_problem(problem, objective='two_stage', solver_options=solver_options_type(),
+                     previous_plan=None, changed_task_ids=None, freeze_margin=None, decompose=True, max_workers=None,
+                     time_step=None, coarse_time_step=None, formulation='nonlinear', on_solution=None, search_control=None,
+                     mode='cpsat'):
+    started_at = time.perf_counter()
+
+    if objective not in ('two_stage', 'hint', 'weighted'):
+        raise ValueError(f'Unknown objective {objective}')
+    if formulation not in ('nonlinear', 'linear'):
+        raise ValueError(f'Unknown formulation {formulation}')
+    if mode not in ('cpsat', 'greedy', 'hybrid'):
+        raise ValueError(f'Unknown mode {mode}')
+    for step in (time_step, coarse_time_step):
+        if step is not None and (not isinstance(step, int) or step <= 0):
+            raise ValueError(f'Time step should be a positive integer, got {step}')
+
+    if not len(problem.tasks):
         return {
-            "found": False,
+            "found": True,
+            "status": 'OPTIMAL',
+            "stages": [],
+            "components": 0,
+            "pruned": {},
             "tasks": []
         }
+
+    coarse_stages = []
+    hint_plan = None
+    if coarse_time_step is not None and previous_plan is None and mode != 'greedy':
+        coarse_solver_options = solver_options
+        if solver_options.time_limit_ms is not None:
+            coarse_solver_options = solver_options._replace(time_limit_ms=solver_options.time_limit_ms / 2)
+        coarse_result = schedule_problem(problem, objective, coarse_solver_options, decompose=decompose, max_workers=max_workers,
+                                         time_step=coarse_time_step, formulation=formulation, search_control=search_control)
+        coarse_stages = [dict(stage, name='coarse' + stage["name"][0].upper() + stage["name"][1:]) for stage in coarse_result["stages"]]
+        if coarse_result["found"]:
+            hint_plan = coarse_result["tasks"]
+        if solver_options.time_limit_ms is not None and solver_options.deterministic:
+            used_time = sum([stage["deterministicTime"] for stage in coarse_stages])
+            solver_options = solver_options._replace(time_limit_ms=max(solver_options.time_limit_ms - used_time * 1000, 0))
+
+    step = time_step or common_time_step(problem, previous_plan)
+    rescaled_problem = rescale_problem(problem, step)
+    request_previous_plan = previous_plan
+    if hint_plan is not None:
+        # The coarse schedule only warm starts the solver
+        previous_plan, freeze_margin = rescale_plan(hint_plan, problem.start, step), None
+    elif previous_plan:
+        previous_plan = rescale_plan(previous_plan, problem.start, step)
+    if freeze_margin is not None:
+        freeze_margin = -(-freeze_margin // step)
+
+    # Horizon is the greatest due date, rounded down to a step (the rescaled max due
+    # date of a delayable task can be moved a step later)
+    horizon = (max([task.max_due_date for task in problem.tasks]) - problem.start) // step
+
+    hint_only = hint_plan is not None
+    greedy_result = None
+    if mode != 'cpsat':
+        greedy_result = greedy_schedule(rescaled_problem, horizon, step, previous_plan, changed_task_ids)
+        if on_solution is not None:
+            on_solution('greedy', greedy_result["stages"][0]["objective"], unscale_tasks(
+                {task_id: dict(planned_task) for task_id, planned_task in greedy_result["tasks"].items()}, problem, step
+            ))
+        if mode == 'greedy':
+            return mark_request_moved_tasks(unscale_result(dict(greedy_result, components=1), problem, step), request_previous_plan)
+        if previous_plan is None:
+            previous_plan, freeze_margin, hint_only = greedy_result["tasks"], None, True
+    problems = split_problem(rescaled_problem, horizon, step) if decompose else [rescaled_problem]
+
+    # The request budget also covers rescaling and splitting the problem
+    if solver_options.time_limit_ms is not None and not solver_options.deterministic:
+        solver_options = solver_options._replace(time_limit_ms=max(solver_options.time_limit_ms - (time.perf_counter() - started_at) * 1000, 0))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if on_solution is not None or search_control is not None:
+        max_workers = 1
+    results = None
+    if len(problems) > 1 and max_workers > 1:
+        chunks = balance_chunks(problems, max_workers)
+        # Share the CPUs between processes, unless the request sets the solver workers
+        chunk_solver_options = solver_options
+        if solver_options.num_workers is None:
+            chunk_solver_options = solver_options._replace(num_workers=max((os.cpu_count() or 1) // len(chunks), 1))
+        pool_started_at = time.perf_counter()
+        pool = get_process_pool(max_workers)
+        try:
+            futures = [
+                pool.submit(solve_components, [problems[problem_id] for problem_id in chunk], horizon, step, objective, formulation,
+                            chunk_solver_options, previous_plan, changed_task_ids, freeze_margin)
+                for chunk in chunks
+            ]
+            results = [None] * len(problems)
+            for chunk, future in zip(chunks, futures):
+                for problem_id, result in zip(chunk, future.result()):
+                    results[problem_id] = result
+        except BrokenProcessPool:
+            # A worker died: the next requests start a new pool, this one is solved here
+            logger.exception('Process pool is broken')
+            discard_process_pool(pool)
+            results = None
+            if solver_options.time_limit_ms is not None and not solver_options.deterministic:
+                solver_options = solver_options._replace(time_limit_ms=max(solver_options.time_limit_ms - (time.perf_counter() - pool_started_at) * 1000, 0))
+    if results is None:
+        component_on_solution = None
+        if on_solution is not None:
+            def component_on_solution(name, objective_value, planned_tasks):
+                on_solution(name, objective_value, unscale_tasks(planned_tasks, problem, step))
+        results = solve_components(problems, horizon, step, objective, formulation, solver_options, previous_plan, changed_task_ids, freeze_margin,
+                                   component_on_solution, search_control)
+    if greedy_result is not None:
+        for component, component_result in zip(problems, results):
+            if not component_result["found"]:
+                component_result.update(found=True, status='FEASIBLE', tasks={
+                    task.id: dict(greedy_result["tasks"][task.id]) for task in component.tasks
+                })
+    result = unscale_result(merge_results(rescaled_problem, results), problem, step)
+    result["stages"] = coarse_stages + (greedy_result["stages"] if greedy_result is not None else []) + result["stages"]
+    if hint_only:
+        # Tasks did not move from a plan the caller knows
+        for planned_task in (result["tasks"] or {}).values():
+            planned_task.pop("moved", None)
+    else:
+        mark_request_moved_tasks(result, request_previous_plan)
+    return result
+
+
+# Schedule tasks given as pandas DataFrames
+def schedule(tasks, reserved_intervals, reserved_tags, start, **options):
+    return schedule_problem(problem_from_dataframes(tasks, reserved_intervals, reserved_tags, start), **options)
+
+
+# Result of a batch problem that could not be scheduled
+def batch_error(status, error):
+    return {
+        "found": False,
+        "status": status,
+        "error": str(error),
+        "stages": [],
+        "tasks": None
+    }
+
+
+# Schedule one problem of a batch. Errors are returned so that they do not fail the batch.
+def schedule_batch_problem(problem, options):
+    try:
+        return schedule_problem(problem, **options)
+    except ValueError as e:
+        return batch_error('INVALID', e)
+    except Exception as e:
+        logger.exception('Batch problem failed')
+        return batch_error('ERROR', e)
+
+
+# Schedule independent problems, each with its own keyword arguments of schedule_problem
+# (options, a list of dicts) on the process pool shared with decomposed requests. Its
+# workers stay up between batches. Yields (problem index, result) pairs in order, or as
+# problems complete when ordered is False.
+def schedule_batch(problems, options=None, max_workers=None, ordered=True):
+    options = options if options is not None else [{} for _ in problems]
+    if len(options) != len(problems):
+        raise ValueError(f'Expected {len(problems)} options, got {len(options)}')
+    max_workers = max_workers or os.cpu_count() or 1
+    if len(problems) <= 1 or max_workers == 1:
+        for problem_id, (problem, problem_options) in enumerate(zip(problems, options)):
+            yield problem_id, schedule_batch_problem(problem, problem_options)
+        return
+
+    # Problems already run in parallel, each one is solved in one process
+    problem_workers = max((os.cpu_count() or 1) // min(max_workers, len(problems)), 1)
+    pool = get_process_pool(max_workers)
+    futures = {}
+    for problem_id, (problem, problem_options) in enumerate(zip(problems, options)):
+        solver_options = problem_options.get('solver_options', solver_options_type())
+        if solver_options.num_workers is None:
+            solver_options = solver_options._replace(num_workers=problem_workers)
+        problem_options = dict(problem_options, solver_options=solver_options, max_workers=1)
+        futures[pool.submit(schedule_batch_problem, problem, problem_options)] = problem_id
+    for future in (futures if ordered else as_completed(futures)):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            discard_process_pool(pool)
+            result = batch_error('ERROR', str(e) or 'A worker process died')
+        yield futures[future], result
+
+
+# Schedule (tasks, reserved_intervals, reserved_tags, start) tuples of DataFrames with schedule_batch
+def schedule_calendars(calendars, options=None, max_workers=None, ordered=True):
+    return schedule_batch([problem_from_dataframes(*calendar) for calendar in calendars], options, max_workers, ordered)
@@ -0,0 +1,30 @@
+from benchmark import compare_runs, generate_request, run_case
+
+
+def test_generate_request_should_be_reproducible_from_its_seed():
+    request = generate_request(3, 30, tag_count=4, reserved_tag_count=5, reserved_interval_count=6, horizon=200, tightness=0.8)
+    assert request == generate_request(3, 30, tag_count=4, reserved_tag_count=5, reserved_interval_count=6, horizon=200, tightness=0.8)
+    assert request != generate_request(4, 30, tag_count=4, reserved_tag_count=5, reserved_interval_count=6, horizon=200, tightness=0.8)
+    assert len(request["events"]) == 30
+    assert len(request["reservedTags"]) == 5
+    assert len(request["reservedIntervals"]) == 6
+    assert set([tag for event in request["events"] for tag in event["tags"]]) <= set(['tag0', 'tag1', 'tag2', 'tag3'])
+    for event in request["events"]:
+        assert event["duration"] <= event["dueDate"] <= event["maxDueDate"]
+
+
+def test_run_case_should_report_model_and_stages():
+    options = {"objective": 'two_stage', "formulation": 'nonlinear', "timeLimitMs": 10000, "numWorkers": None, "deterministic": False}
+    run = run_case({"tasks": 5, "tags": 1, "reservedTags": 1, "reservedIntervals": 1, "horizon": None, "tightness": 0.5, "seed": 0}, options)
+    assert run["status"] == 'OPTIMAL'
+    assert run["variables"] > 0 and run["constraints"] > 0
+    assert [stage["name"] for stage in run["stages"]] == ['rawPriority', 'priority']
+    assert run["peakRssMb"] > 0
+
+
+def test_compare_runs_should_flag_slower_runs_and_worse_objectives():
+    def run(name, status, wall_time, objectives):
+        return {"name": name, "status": status, "wallTime": wall_time, "objectives": objectives, "peakRssMb": 50}
+    old = {"runs": [run('a', 'OPTIMAL', 1.0, [10, 100]), run('b', 'FEASIBLE', 5.0, [10, 100]), run('c', 'OPTIMAL', 1.0, [10, 100])]}
+    new = {"runs": [run('a', 'OPTIMAL', 1.5, [10, 100]), run('b', 'FEASIBLE', 5.0, [10, None]), run('c', 'OPTIMAL', 1.1, [10, 100])]}
+    assert [result["regressions"] for result in compare_runs(old, new, threshold=0.2)] == [['wallTime'], ['objectives'], []]
@@ -0,0 +1,75 @@
+from cache import MemoryCache, ResultCache, SqliteCache, request_key
+from problem import parse_problem
+from schedule_ortools import solver_options_type
+
+
+def request_data(start):
+    return {
+        "events": [
+            {"id": "a", "impact": 2, "duration": 3, "dueDate": start + 10, "maxDueDate": start + 15, "tags": ['Perso', 'Autre']},
+            {"id": "b", "impact": 1, "duration": 2, "dueDate": start + 12, "maxDueDate": start + 12, "tags": []}
+        ],
+        "reservedIntervals": [{"start": start + 2, "end": start + 4}],
+        "reservedTags": [{"start": start, "end": start + 20, "tags": ['Perso', 'Autre']}],
+        "start": start
+    }
+
+
+def test_request_key_should_ignore_order_and_start_shift():
+    key, offset = request_key(parse_problem(request_data(0)), {"solver_options": solver_options_type()})
+    data = request_data(100)
+    data["events"] = list(reversed(data["events"]))
+    data["events"][1]["tags"] = ['Autre', 'Perso']
+    data["events"][1]["name"] = 'Not used by the scheduler'
+    shifted_key, shifted_offset = request_key(parse_problem(data), {"solver_options": solver_options_type()})
+    assert shifted_key == key
+    assert offset == 0
+    assert shifted_offset == -100
+
+
+def test_request_key_should_depend_on_solver_options():
+    key, offset = request_key(parse_problem(request_data(0)), {"solver_options": solver_options_type()})
+    other_key, offset = request_key(parse_problem(request_data(0)), {"solver_options": solver_options_type(time_limit_ms=1000)})
+    assert other_key != key
+
+
+def test_result_cache_should_shift_results_to_request_start():
+    result_cache = ResultCache(MemoryCache(max_size=2, ttl=60))
+    key, offset = request_key(parse_problem(request_data(0)), {"solver_options": solver_options_type()})
+    assert result_cache.get(key, offset) is None
+    result_cache.set(key, offset, {"found": True, "status": 'OPTIMAL', "stages": [], "tasks": {"a": {"start": 5, "end": 8}}})
+    key, offset = request_key(parse_problem(request_data(100)), {"solver_options": solver_options_type()})
+    result = result_cache.get(key, offset)
+    assert result["cached"] == True
+    assert result["tasks"]["a"]["start"] == 105
+    assert result["tasks"]["a"]["end"] == 108
+    assert result_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_result_cache_should_not_store_timed_out_results():
+    result_cache = ResultCache(MemoryCache(max_size=2, ttl=60))
+    result_cache.set('key', 0, {"found": True, "status": 'FEASIBLE', "stages": [], "tasks": {}})
+    assert result_cache.get('key', 0) is None
+
+
+def test_memory_cache_should_evict_least_recently_used_and_expired_entries():
+    memory_cache = MemoryCache(max_size=2, ttl=60)
+    memory_cache.set('a', '1')
+    memory_cache.set('b', '2')
+    memory_cache.get('a')
+    memory_cache.set('c', '3')
+    assert memory_cache.get('b') is None
+    assert memory_cache.get('a') == '1'
+    memory_cache.ttl = -1
+    assert memory_cache.get('a') is None
+
+
+def test_sqlite_cache_should_evict_least_recently_used_entries(tmp_path):
+    sqlite_cache = SqliteCache(str(tmp_path / 'cache.db'), max_size=2, ttl=60)
+    sqlite_cache.set('a', '1')
+    sqlite_cache.set('b', '2')
+    sqlite_cache.get('a')
+    sqlite_cache.set('c', '3')
+    assert sqlite_cache.get('b') is None
+    assert sqlite_cache.get('a') == '1'
+    assert SqliteCache(str(tmp_path / 'cache.db'), max_size=2, ttl=60).get('c') == '3'
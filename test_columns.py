@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import pytest
+from columns import problem_from_columns, read_columns, request_columns, result_columns, write_columns
+from problem import parse_problem
+from schedule_ortools import schedule_problem
+
+request = {
+    "events": [
+        {"id": "a", "impact": 2, "duration": 3, "dueDate": 10, "maxDueDate": 15, "tags": ['Sport']},
+        {"id": "b", "impact": 1.5, "duration": 2, "dueDate": 10, "tags": []},
+        {"id": "c", "impact": 4, "duration": 1, "dueDate": 12, "tags": ['Sport', 'Perso']}
+    ],
+    "reservedIntervals": [{"start": 0, "end": 2}],
+    "reservedTags": [{"start": 2, "end": 8, "tags": ['Sport', 'Perso'], "isTransparent": True}],
+    "start": 0
+}
+
+
+def test_request_columns_should_round_trip_a_problem():
+    problem = parse_problem(request)
+    arrays = read_columns(write_columns(request_columns(problem, {"objective": 'weighted'})))
+    assert arrays["tagNames"].tolist() == ['Perso', 'Sport']
+    assert arrays["taskTagOffsets"].tolist() == [0, 1, 1, 3]
+    assert problem_from_columns(arrays) == problem
+    assert str(arrays["options"]) == '{"objective": "weighted"}'
+
+
+@pytest.mark.parametrize('name, value', [
+    ('durations', np.array([3, 0, 1])),
+    ('dueDates', np.array([10.0, 10.0, 12.0])),
+    ('maxDueDates', np.array([15, 9, 12])),
+    ('taskTags', np.array([1, 0, 5], dtype=np.int32)),
+    ('taskTagOffsets', np.array([0, 2, 1, 3])),
+    ('windowEnds', np.array([1]))
+])
+def test_problem_from_columns_should_reject_invalid_columns(name, value):
+    arrays = request_columns(parse_problem(request))
+    arrays[name] = value
+    with pytest.raises(ValueError):
+        problem_from_columns(arrays)
+
+
+def test_result_columns_should_list_tasks_in_request_order():
+    problem = parse_problem(request)
+    result = schedule_problem(problem)
+    arrays = read_columns(write_columns(result_columns(result, problem)))
+    assert arrays["taskIds"].tolist() == ['a', 'b', 'c']
+    assert arrays["starts"].tolist() == [result["tasks"][task_id]["start"] for task_id in ('a', 'b', 'c')]
+    assert arrays["isPresent"].tolist() == [True, True, True]
+    assert "moved" not in arrays
+    summary = json.loads(str(arrays["summary"]))
+    assert summary["status"] == result["status"]
+    assert "tasks" not in summary
+
+
+def test_read_columns_should_reject_other_bodies():
+    with pytest.raises(ValueError):
+        read_columns(b'{"events": []}')
@@ -0,0 +1,32 @@
+import dataclasses
+import functools
+import math
+import pytest
+from fixtures import load_problem
+from schedule_ortools import schedule, schedule_problem, truncated_division
+import test_schedule
+
+
+# Every scenario of test_schedule.py behaves the same with the linear formulation
+@pytest.mark.parametrize('test', [getattr(test_schedule, name) for name in dir(test_schedule) if name.startswith('test_')])
+def test_schedule_tests_should_pass_with_linear_formulation(test, monkeypatch):
+    monkeypatch.setattr(test_schedule, 'schedule', functools.partial(schedule, formulation='linear'))
+    test()
+
+
+@pytest.mark.parametrize('task_count', [8, 12, 16])
+def test_linear_formulation_should_match_nonlinear_formulation_on_data_fixtures(task_count):
+    problem = load_problem('data/tasks.csv', 'data/tags.csv')
+    problem = dataclasses.replace(problem, tasks=problem.tasks[:task_count])
+    results = {formulation: schedule_problem(problem, formulation=formulation) for formulation in ['nonlinear', 'linear']}
+    for result in results.values():
+        assert result["status"] == 'OPTIMAL'
+    assert [round(stage["objective"]) for stage in results['linear']["stages"]] == [round(stage["objective"]) for stage in results['nonlinear']["stages"]]
+    for task in problem.tasks:
+        planned_task = results['linear']["tasks"][task.id]
+        assert planned_task["isPresent"] == results['nonlinear']["tasks"][task.id]["isPresent"]
+        # Delay and priority keep their definition
+        if planned_task["isPresent"] and task.max_due_date != task.due_date:
+            delay = truncated_division((task.due_date - planned_task["end"]) * 100, task.max_due_date - task.due_date)
+            assert planned_task["delay"] == delay
+            assert planned_task["priority"] == math.floor(task.impact * 100 / task.duration) * delay
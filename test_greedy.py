@@ -0,0 +1,67 @@
+from benchmark import generate_request
+from greedy import earliest_free_start, greedy_schedule
+from problem import Problem, ReservedInterval, ReservedTag, Task, parse_problem
+from schedule_ortools import schedule_problem, solver_options_type
+
+
+def test_earliest_free_start_should_skip_occupied_intervals():
+    assert earliest_free_start([(0, 20)], 3, [0, 5], [4, 7]) == 7
+    assert earliest_free_start([(0, 1), (9, 12)], 2, [0, 5], [4, 10]) == 10
+    assert earliest_free_start([(0, 3)], 3, [0], [4]) is None
+
+
+def test_greedy_schedule_should_place_best_impact_per_duration_first_in_free_windows():
+    problem = Problem(
+        tasks=[
+            Task(id='low', impact=1, duration=2, due_date=10, max_due_date=10, tags=frozenset()),
+            Task(id='high', impact=6, duration=2, due_date=10, max_due_date=10, tags=frozenset()),
+            Task(id='sport', impact=1, duration=2, due_date=10, max_due_date=15, tags=frozenset(['Sport'])),
+            Task(id='long', impact=9, duration=14, due_date=10, max_due_date=10, tags=frozenset())
+        ],
+        reserved_intervals=[ReservedInterval(start=0, end=2)],
+        reserved_tags=[ReservedTag(start=6, end=8, tags=frozenset(['Sport']), is_transparent=True)],
+        start=0
+    )
+    result = greedy_schedule(problem, 15, 1)
+    tasks = result["tasks"]
+    assert [tasks[task_id]["start"] for task_id in ('high', 'low', 'sport')] == [2, 4, 6]
+    assert tasks['long']["isPresent"] == False
+    assert tasks['sport']["delay"] == (10 - 8) * 100 // 5
+    assert result["stages"][0]["objective"] == 300 + 50 + 50
+
+
+def test_greedy_schedule_should_keep_unchanged_tasks_of_previous_plan():
+    problem = Problem(
+        tasks=[
+            Task(id=1, impact=1, duration=2, due_date=10, max_due_date=10, tags=frozenset()),
+            Task(id=2, impact=5, duration=2, due_date=10, max_due_date=10, tags=frozenset())
+        ],
+        reserved_intervals=[],
+        reserved_tags=[],
+        start=0
+    )
+    previous_plan = {1: {"start": 0, "end": 2, "isPresent": True}, 2: {"start": 6, "end": 8, "isPresent": True}}
+    tasks = greedy_schedule(problem, 10, 1, previous_plan)["tasks"]
+    assert (tasks[1]["start"], tasks[2]["start"]) == (0, 6)
+    assert tasks[1]["moved"] == False
+    tasks = greedy_schedule(problem, 10, 1, previous_plan, changed_task_ids=[2])["tasks"]
+    assert tasks[2]["start"] == 2
+    assert tasks[2]["moved"] == True
+
+
+def test_schedule_problem_modes_should_give_valid_schedules():
+    problem = parse_problem(generate_request(3, 40, tag_count=3, reserved_tag_count=4, reserved_interval_count=4))
+    greedy_result = schedule_problem(problem, mode='greedy')
+    assert greedy_result["status"] == 'FEASIBLE'
+    assert [stage["name"] for stage in greedy_result["stages"]] == ['greedy']
+    hybrid_result = schedule_problem(problem, solver_options=solver_options_type(time_limit_ms=2000, num_workers=1), mode='hybrid')
+    assert hybrid_result["stages"][0]["name"] == 'greedy'
+    assert hybrid_result["stages"][1]["objective"] >= greedy_result["stages"][0]["objective"]
+    for result in (greedy_result, hybrid_result):
+        present = sorted([(task["start"], task["end"]) for task in result["tasks"].values() if task["isPresent"]])
+        assert all([end <= next_start for (start, end), (next_start, next_end) in zip(present, present[1:])])
+        assert all(["moved" not in task for task in result["tasks"].values()])
+    # Without time for the solver, hybrid answers the greedy schedule
+    fallback_result = schedule_problem(problem, solver_options=solver_options_type(time_limit_ms=0), mode='hybrid')
+    assert fallback_result["found"] == True
+    assert fallback_result["tasks"] == greedy_result["tasks"]
@@ -0,0 +1,219 @@
+from index import app
+import json
+import os
+import subprocess
+import sys
+
+
+def test_schedule_events_should_schedule_posted_events():
+    client = app.test_client()
+    response = client.post('/', json={
+        "events": [{"id": "a", "impact": 2, "duration": 3, "dueDate": 10, "maxDueDate": 15, "tags": []}],
+        "reservedIntervals": [{"start": 0, "end": 5}],
+        "reservedTags": [],
+        "start": 0
+    })
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["found"] == True
+    assert result["status"] == 'OPTIMAL'
+    assert result["tasks"]["a"]["start"] >= 5
+
+
+def test_schedule_events_should_apply_request_solver_options():
+    client = app.test_client()
+    response = client.post('/', json={
+        "events": [{"id": i, "impact": (i * 7) % 9 + 1, "duration": i % 5 + 1, "dueDate": 20 + (i * 13) % 80, "maxDueDate": 50 + (i * 13) % 80, "tags": []} for i in range(40)],
+        "reservedIntervals": [],
+        "reservedTags": [],
+        "start": 0,
+        "timeLimitMs": 0,
+        "numWorkers": 1
+    })
+    assert response.status_code == 200
+    assert response.get_json()["status"] == 'TIMEOUT'
+
+
+def test_schedule_events_should_accept_previous_response_as_previous_plan():
+    client = app.test_client()
+    data = {
+        "events": [{"id": 1, "impact": 2, "duration": 3, "dueDate": 10, "maxDueDate": 15, "tags": []}],
+        "reservedIntervals": [],
+        "reservedTags": [],
+        "start": 0
+    }
+    previous = client.post('/', json=data).get_json()
+    data["previousPlan"] = previous["tasks"]
+    data["freezeMargin"] = 0
+    result = client.post('/', json=data).get_json()
+    assert result["found"] == True
+    assert result["tasks"]["1"]["start"] == previous["tasks"]["1"]["start"]
+    assert result["tasks"]["1"]["moved"] == False
+
+
+def test_schedule_events_should_answer_identical_requests_from_cache():
+    client = app.test_client()
+    data = {
+        "events": [{"id": "cached", "impact": 2, "duration": 3, "dueDate": 1010, "maxDueDate": 1015, "tags": []}],
+        "reservedIntervals": [{"start": 1000, "end": 1002}],
+        "reservedTags": [],
+        "start": 1000
+    }
+    first = client.post('/', json=data).get_json()
+    hits = client.get('/cache').get_json()["hits"]
+    second = client.post('/', json=data).get_json()
+    assert "cached" not in first
+    assert second["cached"] == True
+    assert second["tasks"]["cached"]["start"] == first["tasks"]["cached"]["start"]
+    assert client.get('/cache').get_json()["hits"] == hits + 1
+
+
+def test_schedule_events_should_reject_invalid_requests():
+    client = app.test_client()
+    response = client.post('/', json={
+        "events": [{"id": "a", "impact": 2, "dueDate": 10, "maxDueDate": 15, "tags": []}],
+        "reservedIntervals": [],
+        "reservedTags": [],
+        "start": 0
+    })
+    assert response.status_code == 400
+    for incremental_options in ({"previousPlan": {"a": {"isPresent": True}}}, {"freezeMargin": 'soon'}, {"timeLimitMs": 'abc'}):
+        response = client.post('/', json=dict({
+            "events": [{"id": "a", "impact": 2, "duration": 2, "dueDate": 10, "maxDueDate": 15, "tags": []}],
+            "reservedIntervals": [],
+            "reservedTags": [],
+            "start": 0
+        }, **incremental_options))
+        assert response.status_code == 400
+    assert client.post('/', data='null', content_type='application/json').status_code == 400
+    assert client.post('/', json={"events": [{"id": [1]}], "reservedIntervals": [], "reservedTags": [], "start": 0}).status_code == 400
+
+
+def test_metrics_should_expose_request_outcomes_and_stage_latencies():
+    client = app.test_client()
+    client.post('/', json={
+        "events": [{"id": "metrics", "impact": 2, "duration": 3, "dueDate": 17, "maxDueDate": 19, "tags": []}],
+        "reservedIntervals": [],
+        "reservedTags": [],
+        "start": 0
+    })
+    client.post('/', json={"events": []})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    metrics = response.get_data(as_text=True)
+    assert 'scheduler_requests_total{outcome="OPTIMAL"}' in metrics
+    assert 'scheduler_requests_total{outcome="invalid"}' in metrics
+    for span in ['parse', 'build', 'rawPriority', 'priority']:
+        assert f'scheduler_span_seconds_count{{span="{span}"}}' in metrics
+    assert 'scheduler_solver_conflicts_total{stage="priority"}' in metrics
+
+
+def test_jobs_should_stream_solutions_then_the_result():
+    client = app.test_client()
+    response = client.post('/jobs', json={
+        "events": [{"id": i, "impact": i % 4 + 1, "duration": 2, "dueDate": 8, "maxDueDate": 12, "tags": []} for i in range(6)],
+        "reservedIntervals": [],
+        "reservedTags": [],
+        "start": 0
+    })
+    assert response.status_code == 202
+    job_id = response.get_json()["id"]
+    assert response.headers["Location"] == f'/jobs/{job_id}'
+    events = client.get(f'/jobs/{job_id}/events').get_data(as_text=True)
+    assert 'event: solution' in events
+    assert events.rstrip().split('\n\n')[-1].split('\n')[1] == 'event: done'
+    job = client.get(f'/jobs/{job_id}').get_json()
+    assert job["status"] == 'done'
+    assert job["result"]["status"] == 'OPTIMAL'
+    assert len(job["result"]["tasks"]) == 6
+    resumed = client.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': '0'}).get_data(as_text=True)
+    assert not resumed.startswith('id: 0\n')
+    assert client.get(f'/jobs/{job_id}/events', headers={'Last-Event-ID': 'last'}).status_code == 400
+    assert client.delete(f'/jobs/{job_id}').get_json()["status"] == 'done'
+
+
+def test_jobs_should_reject_unknown_jobs_and_invalid_requests():
+    client = app.test_client()
+    assert client.get('/jobs/unknown').status_code == 404
+    assert client.get('/jobs/unknown/events').status_code == 404
+    assert client.delete('/jobs/unknown').status_code == 404
+    assert client.post('/jobs', json={"events": [{"id": 1}]}).status_code == 400
+
+
+def test_batch_should_schedule_requests_in_order_and_isolate_invalid_ones():
+    client = app.test_client()
+    requests = [{
+        "events": [{"id": "a", "impact": 2, "duration": 3, "dueDate": 10 + offset, "maxDueDate": 15 + offset, "tags": []}],
+        "reservedIntervals": [{"start": offset, "end": offset + 5}],
+        "reservedTags": [],
+        "start": offset
+    } for offset in (0, 100)]
+    requests.insert(1, {"events": [{"id": 1}]})
+    requests.append(dict(requests[0], previousPlan={"a": {"isPresent": True}}))
+    requests.append(dict(requests[0], numWorkers='abc'))
+    response = client.post('/batch', json={"requests": requests})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [result["status"] for result in results] == ['OPTIMAL', 'INVALID', 'OPTIMAL', 'INVALID', 'INVALID']
+    assert results[2]["tasks"]["a"]["start"] >= 105
+    streamed = client.post('/batch', json={"requests": requests, "stream": True})
+    assert streamed.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in streamed.get_data(as_text=True).splitlines()]
+    assert sorted([line["index"] for line in lines]) == [0, 1, 2, 3, 4]
+    assert client.post('/batch', json={"requests": 1}).status_code == 400
+
+
+def test_schedule_events_should_apply_request_mode():
+    client = app.test_client()
+    response = client.post('/', json={
+        "events": [{"id": "a", "impact": 2, "duration": 3, "dueDate": 10, "maxDueDate": 15, "tags": []}],
+        "reservedIntervals": [{"start": 0, "end": 5}],
+        "reservedTags": [],
+        "start": 0,
+        "mode": 'greedy'
+    })
+    assert response.status_code == 200
+    result = response.get_json()
+    assert [stage["name"] for stage in result["stages"]] == ['greedy']
+    assert result["tasks"]["a"]["start"] == 5
+
+
+def test_index_should_only_import_the_solver_when_needed():
+    imported = subprocess.run(
+        [sys.executable, '-c', 'import sys, index; print("ortools" in sys.modules)'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, SCHEDULER_PRELOAD='false'),
+        capture_output=True, text=True, check=True
+    )
+    assert imported.stdout.strip() == 'False'
+
+
+def test_schedule_events_should_read_and_answer_numpy_columns():
+    from columns import read_columns, request_columns, write_columns
+    from problem import parse_problem
+    client = app.test_client()
+    problem = parse_problem({
+        "events": [{"id": 1, "impact": 2, "duration": 3, "dueDate": 10, "maxDueDate": 15, "tags": ['Sport']}],
+        "reservedIntervals": [{"start": 0, "end": 5}],
+        "reservedTags": [{"start": 0, "end": 10, "tags": ['Sport'], "isTransparent": True}],
+        "start": 0
+    })
+    body = write_columns(request_columns(problem, {"timeLimitMs": 5000}))
+    response = client.post('/', data=body, content_type='application/x-npz', headers={'Accept': 'application/x-npz'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-npz'
+    arrays = read_columns(response.get_data())
+    assert arrays["taskIds"].tolist() == [1]
+    assert arrays["starts"].tolist() == [5]
+    assert json.loads(str(arrays["summary"]))["status"] == 'OPTIMAL'
+    # Cached results keep their tasks in the order of the problem
+    response = client.post('/', data=body, content_type='application/x-npz', headers={'Accept': 'application/x-npz'})
+    assert response.status_code == 200
+    arrays = read_columns(response.get_data())
+    assert arrays["taskIds"].tolist() == [1]
+    assert arrays["starts"].tolist() == [5]
+    assert json.loads(str(arrays["summary"]))["cached"] == True
+    # JSON stays the default answer
+    response = client.post('/', data=body, content_type='application/x-npz')
+    assert response.get_json()["tasks"]["1"]["start"] == 5
+    assert client.post('/', data=b'not an archive', content_type='application/x-npz').status_code == 400
@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+import pytest
+from ortools.sat.python import cp_model
+from benchmark import generate_request
+from jobs import JobManager, QueueFullError
+from problem import parse_problem
+from schedule_ortools import SolutionCallback, schedule_problem, solve_stage, solver_options_type
+
+
+def test_job_manager_should_run_jobs_and_keep_their_events():
+    job_manager = JobManager(max_workers=1, max_queued=4, ttl=60)
+
+    def run(job):
+        job.add_solution('first', 3, {1: {"start": 0}})
+        job.add_solution('first', 2, {1: {"start": 1}})
+        return {"status": 'OPTIMAL'}
+
+    job = job_manager.submit(run)
+    job.future.result()
+    assert job.status == 'done'
+    assert [name for name, data in job.events] == ['solution', 'solution', 'done']
+    assert job.wait_events(2, timeout=0) == [('done', {"status": 'OPTIMAL'})]
+    assert job_manager.get(job.id).describe()["result"] == {"status": 'OPTIMAL'}
+
+
+def test_job_manager_should_cancel_queued_and_running_jobs():
+    job_manager = JobManager(max_workers=1, max_queued=4, ttl=60)
+    started = threading.Event()
+
+    # Stands for a search that runs until it is stopped
+    def run(job):
+        started.set()
+        while not job.search_control.stopped:
+            time.sleep(0.01)
+        return {"status": 'FEASIBLE'}
+
+    running_job = job_manager.submit(run)
+    queued_job = job_manager.submit(run)
+    started.wait()
+    job_manager.cancel(queued_job.id)
+    assert queued_job.status == 'cancelled'
+    job_manager.cancel(running_job.id)
+    running_job.future.result()
+    assert running_job.status == 'cancelled'
+    assert running_job.result == {"status": 'FEASIBLE'}
+    assert job_manager.cancel('unknown') is None
+
+
+def test_job_manager_should_stop_a_running_solver_search():
+    job_manager = JobManager(max_workers=1, max_queued=1, ttl=60)
+    problem = parse_problem(generate_request(0, 120, tag_count=3, reserved_tag_count=6, reserved_interval_count=6))
+    job = job_manager.submit(lambda job: schedule_problem(
+        problem, solver_options=solver_options_type(time_limit_ms=20000), on_solution=job.add_solution, search_control=job.search_control
+    ))
+    # Cancel once the search runs
+    assert job.wait_events(0, timeout=10)
+    cancelled_at = time.perf_counter()
+    job_manager.cancel(job.id)
+    job.future.result()
+    assert time.perf_counter() - cancelled_at < 5
+    assert job.status == 'cancelled'
+    assert job.result["found"] == True
+    assert 'CANCELLED' in [stage["status"] for stage in job.result["stages"]]
+
+
+# Search that finds no solution for a long time: a random 3-SAT formula over the
+# satisfiability threshold, that takes CP-SAT more than 20 s to refute
+def silent_search(job):
+    rng = random.Random(0)
+    model = cp_model.CpModel()
+    literals = [model.NewBoolVar('x%i' % i) for i in range(350)]
+    for _ in range(1610):
+        model.AddBoolOr([literals[i] if rng.random() < 0.5 else literals[i].Not() for i in rng.sample(range(350), 3)])
+    stages = []
+    job.add_event('started', None)
+    solve_stage(model, 'silent', solver_options_type(time_limit_ms=30000, num_workers=1), time.perf_counter(), stages,
+                SolutionCallback('silent', {}, None, job.search_control), job.search_control)
+    return {"stages": stages}
+
+
+def test_job_manager_should_stop_a_search_between_solutions():
+    job_manager = JobManager(max_workers=1, max_queued=1, ttl=60)
+    job = job_manager.submit(silent_search)
+    assert job.wait_events(0, timeout=10)
+    time.sleep(0.5)
+    cancelled_at = time.perf_counter()
+    job_manager.cancel(job.id)
+    job.future.result()
+    assert time.perf_counter() - cancelled_at < 5
+    assert job.status == 'cancelled'
+    assert [stage["status"] for stage in job.result["stages"]] == ['CANCELLED']
+
+
+def test_job_manager_should_limit_queued_jobs():
+    job_manager = JobManager(max_workers=1, max_queued=1, ttl=60)
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(job):
+        started.set()
+        release.wait()
+
+    job_manager.submit(run)
+    started.wait()
+    job_manager.submit(run)
+    with pytest.raises(QueueFullError):
+        job_manager.submit(run)
+    release.set()
+
+
+def test_job_manager_should_report_failed_jobs():
+    job_manager = JobManager(max_workers=1, max_queued=1, ttl=0)
+
+    def run(job):
+        raise RuntimeError('solver crashed')
+
+    job = job_manager.submit(run)
+    job.future.result()
+    assert job.describe()["status"] == 'failed'
+    assert job.result == {"error": 'solver crashed'}
+    job_manager.remove_expired()
+    assert job_manager.get(job.id) is None
@@ -0,0 +1,24 @@
+from metrics import Registry
+
+
+def test_registry_should_render_counters_and_cumulative_histograms():
+    registry = Registry()
+    requests_total = registry.counter('requests_total', 'Requests')
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    requests_total.inc(outcome='OPTIMAL')
+    requests_total.inc(2, outcome='say "hi"')
+    for value in [0.05, 0.5, 5]:
+        latency.observe(value, span='parse')
+    assert registry.render().splitlines() == [
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{outcome="OPTIMAL"} 1',
+        'requests_total{outcome="say \\"hi\\""} 2',
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{span="parse",le="0.1"} 1',
+        'latency_seconds_bucket{span="parse",le="1"} 2',
+        'latency_seconds_bucket{span="parse",le="+Inf"} 3',
+        'latency_seconds_sum{span="parse"} 5.55',
+        'latency_seconds_count{span="parse"} 3',
+    ]
@@ -0,0 +1,61 @@
+import dataclasses
+from presolve import presolve
+from problem import Problem, ReservedInterval, ReservedTag, Task
+from schedule_ortools import schedule_problem
+
+
+def task(task_id, impact=2, duration=2, due_date=20, max_due_date=20, tags=()):
+    return Task(id=task_id, impact=impact, duration=duration, due_date=due_date, max_due_date=max_due_date, tags=frozenset(tags))
+
+
+problem = Problem(
+    tasks=[
+        task('chore 1'),
+        task('no window', tags=['Garden']),
+        task('too long', duration=12),
+        task('too early', due_date=300, max_due_date=301),
+        task('no impact', impact=0),
+        task('chore 2'),
+        task('sport', tags=['Sport']),
+        task('chore 3')
+    ],
+    reserved_intervals=[ReservedInterval(start=8, end=10)],
+    reserved_tags=[ReservedTag(start=0, end=8, tags=frozenset(['Sport']), is_transparent=True)],
+    start=0
+)
+
+
+def test_presolve_should_prune_tasks_that_are_never_planned_and_group_identical_tasks():
+    presolved = presolve(problem, 20, 1)
+    assert presolved.pruned == {1: 'noTagWindow', 2: 'noFreeGap', 3: 'delayBounds', 4: 'noImpact'}
+    assert presolved.identical_groups == [[0, 5, 7]]
+    assert presolved.start_ranges[0] == [(0, 6), (10, 18)]
+    assert presolved.start_ranges[6] == [(0, 6)]
+    assert presolved.start_ranges[1] == []
+
+
+def test_schedule_problem_should_report_pruned_tasks_and_plan_identical_tasks_in_order():
+    # The horizon is the greatest due date, a task due later makes room for every task
+    short_problem = dataclasses.replace(problem, tasks=[task for task in problem.tasks if task.id != 'too early'])
+    result = schedule_problem(short_problem)
+    assert result["status"] == 'OPTIMAL'
+    assert result["pruned"] == {'no window': 'noTagWindow', 'too long': 'noFreeGap', 'no impact': 'noImpact'}
+    assert list(result["tasks"].keys()) == [task.id for task in short_problem.tasks]
+    for task_id in result["pruned"]:
+        assert result["tasks"][task_id]["isPresent"] == False
+    starts = [result["tasks"][task_id]["start"] for task_id in ('chore 1', 'chore 2', 'chore 3')]
+    assert starts == sorted(starts)
+    assert all([result["tasks"][task_id]["isPresent"] for task_id in ('chore 1', 'chore 2', 'chore 3', 'sport')])
+    # Frozen tasks keep their previous start, whatever the order of identical tasks
+    previous_plan = {
+        'chore 1': {"start": 14, "end": 16, "isPresent": True},
+        'chore 2': {"start": 2, "end": 4, "isPresent": True},
+        'chore 3': {"start": 10, "end": 12, "isPresent": True}
+    }
+    result = schedule_problem(short_problem, previous_plan=previous_plan, changed_task_ids=['sport'], freeze_margin=0)
+    assert [result["tasks"][task_id]["start"] for task_id in ('chore 1', 'chore 2', 'chore 3')] == [14, 2, 10]
+    # Without freezing, identical tasks are ordered by their previous start: an
+    # optimal previous plan stays as it is
+    result = schedule_problem(short_problem, previous_plan=previous_plan)
+    assert [result["tasks"][task_id]["start"] for task_id in ('chore 1', 'chore 2', 'chore 3')] == [14, 2, 10]
+    assert [result["tasks"][task_id]["moved"] for task_id in ('chore 1', 'chore 2', 'chore 3')] == [False, False, False]
@@ -0,0 +1,132 @@
+import pandas as pd
+import pytest
+from problem import ReservedInterval, ReservedTag, Task, common_time_step, parse_problem, problem_from_dataframes, read_changed_tasks, \
+    read_freeze_margin, read_previous_plan, read_solver_limits, rescale_problem
+
+
+def test_parse_problem_should_read_request_fields():
+    problem = parse_problem({
+        "events": [{"id": "a", "impact": 2, "duration": 3, "dueDate": 10, "tags": ['Perso']}],
+        "reservedIntervals": [{"start": 0, "end": 5}],
+        "reservedTags": [{"start": 5, "end": 10, "tags": ['Perso'], "isTransparent": True}],
+        "start": 0
+    })
+    assert problem.tasks == [Task(id='a', impact=2, duration=3, due_date=10, max_due_date=10, tags=frozenset(['Perso']))]
+    assert problem.reserved_intervals[0].end == 5
+    assert problem.reserved_tags[0].is_transparent == True
+
+
+@pytest.mark.parametrize('event', [
+    {"id": "a", "impact": 2, "dueDate": 10},
+    {"id": "a", "impact": 2, "duration": 0, "dueDate": 10},
+    {"id": "a", "impact": 2, "duration": 1.5, "dueDate": 10},
+    {"id": "a", "impact": 'high', "duration": 1, "dueDate": 10},
+    {"id": "a", "impact": 2, "duration": 1, "dueDate": 10, "maxDueDate": 5},
+    {"id": "a", "impact": 2, "duration": 1, "dueDate": 10, "tags": 'Perso'},
+    {"id": "a", "impact": 2, "duration": 1, "dueDate": 10, "tags": 5},
+    {"id": ["a"], "impact": 2, "duration": 1, "dueDate": 10},
+    "a",
+])
+def test_parse_problem_should_reject_invalid_events(event):
+    with pytest.raises(ValueError):
+        parse_problem({"events": [event], "reservedIntervals": [], "reservedTags": [], "start": 0})
+
+
+@pytest.mark.parametrize('data', [
+    None,
+    [],
+    {"events": {"id": "a"}, "reservedIntervals": [], "reservedTags": [], "start": 0},
+    {"events": [], "reservedIntervals": [[0, 5]], "reservedTags": [], "start": 0},
+    {"events": [], "reservedIntervals": [], "reservedTags": [None], "start": 0},
+])
+def test_parse_problem_should_reject_invalid_requests(data):
+    with pytest.raises(ValueError):
+        parse_problem(data)
+
+
+@pytest.mark.parametrize('data', [
+    {"previousPlan": [{"start": 0, "isPresent": True}]},
+    {"previousPlan": {"1": 0}},
+    {"previousPlan": {"1": {"isPresent": True}}},
+    {"previousPlan": {"1": {"start": 0}}},
+    {"previousPlan": {"1": {"start": 'soon', "isPresent": True}}},
+    {"previousPlan": {"1": {"start": 5, "end": 2, "isPresent": True}}},
+    {"changedTasks": '1'},
+    {"freezeMargin": '5'},
+    {"freezeMargin": 1.5},
+    {"freezeMargin": -1},
+])
+def test_read_incremental_options_should_reject_invalid_values(data):
+    with pytest.raises(ValueError):
+        read_previous_plan(data)
+        read_changed_tasks(data)
+        read_freeze_margin(data)
+
+
+def test_read_incremental_options_should_accept_previous_results():
+    data = {"previousPlan": {"1": {"start": 0, "end": 2, "isPresent": True, "priority": 5}, "2": {"start": 3, "isPresent": False}},
+            "changedTasks": [2], "freezeMargin": 4}
+    assert read_previous_plan(data) == data["previousPlan"]
+    assert read_changed_tasks(data) == [2]
+    assert read_freeze_margin(data) == 4
+    assert read_previous_plan({}) is None and read_changed_tasks({}) is None and read_freeze_margin({}) is None
+
+
+@pytest.mark.parametrize('data', [
+    {"timeLimitMs": 'abc'},
+    {"timeLimitMs": -1},
+    {"numWorkers": 0},
+    {"numWorkers": 1.5},
+    {"relativeGap": True},
+])
+def test_read_solver_limits_should_reject_invalid_values(data):
+    with pytest.raises(ValueError):
+        read_solver_limits(data, {})
+
+
+def test_read_solver_limits_should_default_missing_values():
+    defaults = {"time_limit_ms": 1000, "num_workers": None, "relative_gap": 0.1}
+    assert read_solver_limits({"numWorkers": 4}, defaults) == {"time_limit_ms": 1000, "num_workers": 4, "relative_gap": 0.1}
+    assert read_solver_limits({"timeLimitMs": 50.5, "relativeGap": 0}, defaults) == {"time_limit_ms": 50.5, "num_workers": None, "relative_gap": 0}
+
+
+def test_problem_from_dataframes_should_not_modify_dataframes():
+    tasks = pd.DataFrame({
+        "id": [1, 2],
+        "impact": [2, None],
+        "duration": [4, 2],
+        "dueDate": [10, 10],
+        "maxDueDate": [15, None],
+        "tags": [[], ['Perso']]
+    })
+    problem = problem_from_dataframes(tasks, pd.DataFrame([]), pd.DataFrame([]), 0)
+    assert problem.tasks[1] == Task(id=2, impact=0, duration=2, due_date=10, max_due_date=10, tags=frozenset(['Perso']))
+    assert tasks['maxDueDate'].dtype == 'float64'
+
+
+def test_common_time_step_should_divide_every_time_from_start():
+    problem = parse_problem({
+        "events": [{"id": "a", "impact": 2, "duration": 30, "dueDate": 1005, "maxDueDate": 1080}],
+        "reservedIntervals": [{"start": 960, "end": 1020}],
+        "reservedTags": [{"start": 1035, "end": 1065, "tags": ['Perso'], "isTransparent": True}],
+        "start": 960
+    })
+    assert common_time_step(problem) == 15
+    assert common_time_step(problem, {"a": {"start": 965, "isPresent": True}}) == 5
+    assert common_time_step(problem, {"a": {"start": 961, "isPresent": False}}) == 15
+
+
+def test_rescale_problem_should_keep_rounded_schedules_valid():
+    problem = parse_problem({
+        "events": [{"id": "a", "impact": 2, "duration": 20, "dueDate": 100, "maxDueDate": 110}],
+        "reservedIntervals": [{"start": 25, "end": 35}],
+        "reservedTags": [{"start": 45, "end": 95, "tags": ['Perso'], "isTransparent": False}],
+        "start": 0
+    })
+    rescaled_problem = rescale_problem(problem, 10)
+    assert rescaled_problem.tasks == [Task(id='a', impact=2, duration=2, due_date=10, max_due_date=11, tags=frozenset(), last_start=9)]
+    # Reserved intervals are widened, tag windows narrowed and their edges blocked
+    assert rescaled_problem.reserved_intervals == [
+        ReservedInterval(start=2, end=4), ReservedInterval(start=4, end=5), ReservedInterval(start=9, end=10)
+    ]
+    assert rescaled_problem.reserved_tags == [ReservedTag(start=5, end=9, tags=frozenset(['Perso']), is_transparent=False)]
@@ -1,5 +1,8 @@
-from schedule_ortools import schedule
+from schedule_ortools import SearchControl, schedule, schedule_calendars, solver_options_type, start_process_pool
+import os
+import signal
 import pandas as pd
+import pytest
 
 
 def test_schedule_event_should_schedule_all_events_if_possible_case_same_due_dates():
@@ -217,4 +220,418 @@ def test_schedule_event_should_plan_events():
     assert result["tasks"]['2a6laipv4ttscfdo4kn6vj6hcv']["start"] >= 5658120
     assert result["tasks"]['2a6laipv4ttscfdo4kn6vj6hcv']["end"] <= 5658252
     assert result["tasks"]['c4rj4c33c4qjebb160q38b9k6gq3cb9o6sq68b9gcko66dr2c8ojgob6c4']["isPresent"] == True
-    assert result["tasks"]['c4rj4c33c4qjebb160q38b9k6gq3cb9o6sq68b9gcko66dr2c8ojgob6c4']["end"] < 5658120
\ No newline at end of file
+    assert result["tasks"]['c4rj4c33c4qjebb160q38b9k6gq3cb9o6sq68b9gcko66dr2c8ojgob6c4']["end"] < 5658120
+
+def test_schedule_event_should_not_fit_between_reserved_intervals_shorter_than_duration():
+    tasks = pd.DataFrame({
+        "id": [1],
+        "impact": [2],
+        "duration": [3],
+        "dueDate": [10],
+        "maxDueDate": [15],
+        "tags": [[]]
+    }, dtype=object)
+    reserved_intervals = pd.DataFrame({
+        "start": [0, 7],
+        "end": [5, 9]
+    }, dtype=object)
+    reserved_tags = pd.DataFrame({
+        "start": [3],
+        "end": [6],
+        "tags": [['Unavailable']],
+        "isTransparent": [False]
+    }, dtype=object)
+    start = 0
+    result = schedule(tasks, reserved_intervals, reserved_tags, start)
+    assert result["found"] == True
+    assert result["tasks"][1]["isPresent"] == True
+    assert result["tasks"][1]["start"] >= 9
+
+
+def test_schedule_event_should_not_be_present_if_no_gap_can_hold_it():
+    tasks = pd.DataFrame({
+        "id": [1],
+        "impact": [2],
+        "duration": [3],
+        "dueDate": [10],
+        "maxDueDate": [10],
+        "tags": [[]]
+    }, dtype=object)
+    reserved_intervals = pd.DataFrame({
+        "start": [2, 6],
+        "end": [4, 8]
+    }, dtype=object)
+    reserved_tags = pd.DataFrame([])
+    start = 0
+    result = schedule(tasks, reserved_intervals, reserved_tags, start)
+    assert result["found"] == True
+    assert result["tasks"][1]["isPresent"] == False
+
+
+def test_schedule_event_should_end_before_the_end_of_compatible_reserved_interval():
+    tasks = pd.DataFrame({
+        "id": [1, 2],
+        "impact": [2, 2],
+        "duration": [3, 3],
+        "dueDate": [10, 10],
+        "maxDueDate": [15, 15],
+        "tags": [['Perso'], ['Perso']]
+    }, dtype=object)
+    reserved_intervals = pd.DataFrame([])
+    reserved_tags = pd.DataFrame({
+        "start": [2, 8],
+        "end": [5, 12],
+        "tags": [['Perso'], ['Perso']],
+        "isTransparent": [False, False]
+    }, dtype=object)
+    start = 0
+    result = schedule(tasks, reserved_intervals, reserved_tags, start)
+    assert result["found"] == True
+    assert result["tasks"][1]["isPresent"] == True
+    assert result["tasks"][2]["isPresent"] == True
+    assert sorted([result["tasks"][1]["start"], result["tasks"][2]["start"]])[0] == 2
+    assert sorted([result["tasks"][1]["end"], result["tasks"][2]["end"]])[1] <= 12
+
+
+def test_schedule_event_should_give_same_priorities_with_every_objective():
+    results = {}
+    for objective in ['two_stage', 'hint', 'weighted']:
+        tasks = pd.DataFrame({
+            "id": [1,2,3,4,5,6],
+            "impact": [3,3,6,4,1,5],
+            "duration": [4,2,5,2,2,6],
+            "dueDate": [2,5,8,12,14,15],
+            "maxDueDate": [4,6,11,13,15,20],
+            "tags": [[],[],[],[],[],[]]
+        })
+        reserved_intervals = pd.DataFrame([])
+        reserved_tags = pd.DataFrame([])
+        start = 0
+        result = schedule(tasks, reserved_intervals, reserved_tags, start, objective=objective)
+        assert result["found"] == True
+        results[objective] = result
+    for objective in ['hint', 'weighted']:
+        for task_id in [1,2,3,4,5,6]:
+            assert results[objective]["tasks"][task_id]["isPresent"] == results['two_stage']["tasks"][task_id]["isPresent"]
+        assert sum([task["priority"] for task in results[objective]["tasks"].values() if task["isPresent"]]) == \
+            sum([task["priority"] for task in results['two_stage']["tasks"].values() if task["isPresent"]])
+
+
+def test_schedule_event_should_reject_unknown_objective():
+    tasks = pd.DataFrame({
+        "id": [1],
+        "impact": [2],
+        "duration": [3],
+        "dueDate": [10],
+        "maxDueDate": [15],
+        "tags": [[]]
+    })
+    with pytest.raises(ValueError):
+        schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0, objective='unknown')
+
+
+def test_schedule_event_should_report_status_and_stages():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [2,3],
+        "duration": [4,2],
+        "dueDate": [10,10],
+        "maxDueDate": [15,15],
+        "tags": [[],[]]
+    })
+    result = schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0)
+    assert result["found"] == True
+    assert result["status"] == 'OPTIMAL'
+    assert [stage["name"] for stage in result["stages"]] == ['rawPriority', 'priority']
+    for stage in result["stages"]:
+        assert stage["status"] == 'OPTIMAL'
+        assert stage["objective"] == stage["bestBound"]
+        assert stage["wallTime"] >= 0
+
+
+def test_schedule_event_should_time_out_without_hanging():
+    tasks = pd.DataFrame({
+        "id": list(range(40)),
+        "impact": [(i * 7) % 9 + 1 for i in range(40)],
+        "duration": [i % 5 + 1 for i in range(40)],
+        "dueDate": [20 + (i * 13) % 80 for i in range(40)],
+        "maxDueDate": [50 + (i * 13) % 80 for i in range(40)],
+        "tags": [[] for i in range(40)]
+    })
+    result = schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0, solver_options=solver_options_type(time_limit_ms=0))
+    assert result["found"] == False
+    assert result["status"] == 'TIMEOUT'
+
+
+def test_schedule_event_should_warm_start_from_previous_plan_and_report_moved_tasks():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [2,3],
+        "duration": [2,2],
+        "dueDate": [10,10],
+        "maxDueDate": [20,20],
+        "tags": [[],[]]
+    })
+    previous = schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0)
+    assert previous["found"] == True
+    tasks = pd.DataFrame({
+        "id": [1,2,3],
+        "impact": [2,3,4],
+        "duration": [2,2,2],
+        "dueDate": [10,10,48],
+        "maxDueDate": [20,20,50],
+        "tags": [[],[],['Sport']]
+    })
+    reserved_tags = pd.DataFrame({
+        "start": [40],
+        "end": [50],
+        "tags": [['Sport']],
+        "isTransparent": [True]
+    }, dtype=object)
+    result = schedule(tasks, pd.DataFrame([]), reserved_tags, 0, previous_plan=previous["tasks"], freeze_margin=5)
+    assert result["found"] == True
+    assert result["tasks"][1]["start"] == previous["tasks"][1]["start"]
+    assert result["tasks"][2]["start"] == previous["tasks"][2]["start"]
+    assert result["tasks"][1]["moved"] == False
+    assert result["tasks"][2]["moved"] == False
+    assert result["tasks"][3]["isPresent"] == True
+    assert result["tasks"][3]["moved"] == True
+    assert result["tasks"][3]["start"] >= 40
+
+
+def test_schedule_event_should_solve_independent_tasks_separately():
+    tasks = pd.DataFrame({
+        "id": [1,2,3,4],
+        "impact": [3,2,4,1],
+        "duration": [3,2,3,2],
+        "dueDate": [6,6,26,26],
+        "maxDueDate": [8,8,28,28],
+        "tags": [['Work'],['Work'],['Sport'],['Sport']]
+    })
+    # Tasks of each tag can only be planned in their own window
+    reserved_tags = pd.DataFrame({
+        "start": [0,20],
+        "end": [8,28],
+        "tags": [['Work'],['Sport']],
+        "isTransparent": [True,True]
+    }, dtype=object)
+    results = {}
+    for decompose, max_workers in [(False, 1), (True, 1), (True, 2)]:
+        result = schedule(tasks, pd.DataFrame([]), reserved_tags, 0, decompose=decompose, max_workers=max_workers)
+        assert result["found"] == True
+        assert result["status"] == 'OPTIMAL'
+        results[(decompose, max_workers)] = result
+    assert results[(False, 1)]["components"] == 1
+    for key in [(True, 1), (True, 2)]:
+        assert results[key]["components"] == 2
+        assert list(results[key]["tasks"].keys()) == [1,2,3,4]
+        for task_id in [1,2,3,4]:
+            assert results[key]["tasks"][task_id]["isPresent"] == True
+        for stage, monolithic_stage in zip(results[key]["stages"], results[(False, 1)]["stages"]):
+            assert stage["name"] == monolithic_stage["name"]
+            assert stage["objective"] == monolithic_stage["objective"]
+
+
+def test_schedule_event_should_solve_independent_tasks_when_a_worker_died():
+    tasks = pd.DataFrame({
+        "id": [1,2,3,4],
+        "impact": [3,2,4,1],
+        "duration": [3,2,3,2],
+        "dueDate": [6,6,26,26],
+        "maxDueDate": [8,8,28,28],
+        "tags": [['Work'],['Work'],['Sport'],['Sport']]
+    })
+    reserved_tags = pd.DataFrame({
+        "start": [0,20],
+        "end": [8,28],
+        "tags": [['Work'],['Sport']],
+        "isTransparent": [True,True]
+    }, dtype=object)
+    for pid in start_process_pool(2):
+        os.kill(pid, signal.SIGKILL)
+    # The broken pool is replaced, the requests after it use a new one
+    for _ in range(2):
+        result = schedule(tasks, pd.DataFrame([]), reserved_tags, 0, decompose=True, max_workers=2)
+        assert result["status"] == 'OPTIMAL'
+        assert result["components"] == 2
+        assert [task["isPresent"] for task in result["tasks"].values()] == [True] * 4
+
+
+def test_schedule_event_should_keep_solved_parts_when_stopped_between_parts():
+    tasks = pd.DataFrame({
+        "id": [1,2,3,4],
+        "impact": [3,2,4,1],
+        "duration": [3,2,3,2],
+        "dueDate": [6,6,26,26],
+        "maxDueDate": [8,8,28,28],
+        "tags": [['Work'],['Work'],['Sport'],['Sport']]
+    })
+    reserved_tags = pd.DataFrame({
+        "start": [0,20],
+        "end": [8,28],
+        "tags": [['Work'],['Sport']],
+        "isTransparent": [True,True]
+    }, dtype=object)
+    search_control = SearchControl()
+    solved_task_ids = set()
+
+    # Stop once the first part has a solution
+    def on_solution(stage, objective, planned_tasks):
+        solved_task_ids.update(planned_tasks.keys())
+        search_control.stop()
+
+    result = schedule(tasks, pd.DataFrame([]), reserved_tags, 0, on_solution=on_solution, search_control=search_control)
+    assert result["found"] == True
+    assert result["status"] == 'FEASIBLE'
+    assert result["components"] == 2
+    assert len(solved_task_ids) == 2
+    assert list(result["tasks"].keys()) == [1,2,3,4]
+    for task_id, planned_task in result["tasks"].items():
+        if task_id not in solved_task_ids:
+            assert planned_task["isPresent"] == False
+
+
+def test_schedule_event_should_keep_the_raw_priority_of_tasks_that_cannot_be_delayed():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [7,8],
+        "duration": [3,1],
+        "dueDate": [10,30],
+        "maxDueDate": [10,30],
+        "tags": [['Work'],['Sport']]
+    })
+    reserved_tags = pd.DataFrame({
+        "start": [0,20],
+        "end": [10,30],
+        "tags": [['Work'],['Sport']],
+        "isTransparent": [True,True]
+    }, dtype=object)
+    results = {
+        decompose: schedule(tasks, pd.DataFrame([]), reserved_tags, 0, decompose=decompose, max_workers=1)
+        for decompose in [False, True]
+    }
+    assert [(stage["name"], stage["objective"]) for stage in results[False]["stages"]] == \
+        [(stage["name"], stage["objective"]) for stage in results[True]["stages"]]
+    greedy_result = schedule(tasks, pd.DataFrame([]), reserved_tags, 0, mode='greedy')
+    for result in [results[False], results[True], greedy_result]:
+        assert result["tasks"][1]["priority"] == 233
+        assert result["tasks"][2]["priority"] == 800
+
+
+def test_schedule_event_should_rescale_times_to_their_common_step():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [2,3],
+        "duration": [30,45],
+        "dueDate": [1080,1080],
+        "maxDueDate": [1200,1200],
+        "tags": [[],[]]
+    })
+    reserved_intervals = pd.DataFrame({
+        "start": [960],
+        "end": [1005]
+    }, dtype=object)
+    result = schedule(tasks, reserved_intervals, pd.DataFrame([]), 960)
+    assert result["found"] == True
+    assert result["timeStep"] == 15
+    assert sorted([task["start"] for task in result["tasks"].values()])[0] == 1005
+    for task in result["tasks"].values():
+        assert task["isPresent"] == True
+        assert (task["start"] - 960) % 15 == 0
+    # Same optimum as on the request grid
+    unscaled_result = schedule(tasks, reserved_intervals, pd.DataFrame([]), 960, time_step=1)
+    assert [stage["objective"] for stage in result["stages"]] == [stage["objective"] for stage in unscaled_result["stages"]]
+    coarse_result = schedule(tasks, reserved_intervals, pd.DataFrame([]), 960, coarse_time_step=60)
+    assert coarse_result["found"] == True
+    assert [stage["name"] for stage in coarse_result["stages"]] == ['coarseRawPriority', 'coarsePriority', 'rawPriority', 'priority']
+    assert [stage["objective"] for stage in coarse_result["stages"][2:]] == [stage["objective"] for stage in result["stages"]]
+
+
+def test_schedule_event_should_not_plan_past_the_request_horizon_with_a_rounded_step():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [1,5],
+        "duration": [4,4],
+        "dueDate": [22,23],
+        "maxDueDate": [23,23],
+        "tags": [[],[]]
+    })
+    reserved_intervals = pd.DataFrame({
+        "start": [0],
+        "end": [16]
+    }, dtype=object)
+    for mode in ['cpsat', 'greedy']:
+        result = schedule(tasks, reserved_intervals, pd.DataFrame([]), 0, time_step=2, mode=mode)
+        assert result["found"] == True
+        assert result["tasks"][2]["isPresent"] == True
+        for task in result["tasks"].values():
+            assert not task["isPresent"] or task["end"] <= 23
+
+
+def test_schedule_event_should_keep_rounded_tasks_within_their_request_delay_bounds():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [5,1],
+        "duration": [4,3],
+        "dueDate": [15,30],
+        "maxDueDate": [18,30],
+        "tags": [[],[]]
+    })
+    reserved_intervals = pd.DataFrame({
+        "start": [0],
+        "end": [12]
+    }, dtype=object)
+    for mode in ['cpsat', 'greedy']:
+        result = schedule(tasks, reserved_intervals, pd.DataFrame([]), 0, time_step=3, mode=mode)
+        # Delay and priority are the ones of the end in request times
+        assert (result["tasks"][1]["start"], result["tasks"][1]["end"]) == (12, 16)
+        assert result["tasks"][1]["delay"] == -33
+        assert result["tasks"][1]["priority"] == 125 * -33
+        # A task that would end after its max due date in request times is not planned
+        late_tasks = tasks.assign(duration=[6,3], maxDueDate=[16,30])
+        result = schedule(late_tasks, reserved_intervals, pd.DataFrame([]), 0, time_step=3, mode=mode)
+        assert result["tasks"][1]["isPresent"] == False
+
+
+def test_schedule_event_should_report_previous_starts_off_the_time_step_as_moved():
+    tasks = pd.DataFrame({
+        "id": [1,2],
+        "impact": [2,3],
+        "duration": [30,15],
+        "dueDate": [120,120],
+        "maxDueDate": [150,150],
+        "tags": [[],[]]
+    })
+    previous_plan = {1: {"start": 7, "end": 37, "isPresent": True}, 2: {"start": 40, "end": 55, "isPresent": True}}
+    for mode in ['cpsat', 'greedy']:
+        # The default step keeps the previous starts on its grid
+        result = schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0, previous_plan=previous_plan, freeze_margin=0, mode=mode)
+        assert [(task["start"], task["moved"]) for task in result["tasks"].values()] == [(7, False), (40, False)]
+        result = schedule(tasks, pd.DataFrame([]), pd.DataFrame([]), 0, previous_plan=previous_plan, freeze_margin=0, time_step=15, mode=mode)
+        assert [(task["start"], task["moved"]) for task in result["tasks"].values()] == [(0, True), (30, True)]
+
+
+def test_schedule_calendars_should_schedule_each_calendar_and_isolate_errors():
+    calendars = [
+        (pd.DataFrame({
+            "id": [1,2],
+            "impact": [2,3],
+            "duration": [day + 1,2],
+            "dueDate": [day * 24 + 10] * 2,
+            "maxDueDate": [day * 24 + 15] * 2,
+            "tags": [[],[]]
+        }), pd.DataFrame([]), pd.DataFrame([]), day * 24)
+        for day in range(3)
+    ]
+    options = [{}, {"objective": 'unknown'}, {"solver_options": solver_options_type(time_limit_ms=5000)}]
+    for max_workers in [1, 2]:
+        results = list(schedule_calendars(calendars, options, max_workers=max_workers))
+        assert [result_id for result_id, result in results] == [0, 1, 2]
+        assert results[1][1]["status"] == 'INVALID'
+        for day in [0, 2]:
+            result = results[day][1]
+            assert result["status"] == 'OPTIMAL'
+            assert result["tasks"][1]["end"] - result["tasks"][1]["start"] == day + 1
+            assert result["tasks"][1]["start"] >= day * 24
+    completed = list(schedule_calendars(calendars, max_workers=2, ordered=False))
+    assert sorted([result_id for result_id, result in completed]) == [0, 1, 2]
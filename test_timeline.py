@@ -0,0 +1,69 @@
+from problem import ReservedInterval, ReservedTag
+from timeline import IntervalIndex, IntervalIndexCache, free_gaps, merge_intervals, overlapping_groups, start_ranges
+
+
+def test_merge_intervals_should_sort_and_coalesce_overlapping_and_touching_intervals():
+    assert merge_intervals([(8, 10), (0, 2), (1, 4), (4, 5), (6, 6)]) == [(0, 5), (8, 10)]
+
+
+def test_free_gaps_should_be_clipped_to_start_and_horizon():
+    assert free_gaps([(0, 5), (8, 10), (20, 30)], 2, 15) == [(5, 8), (10, 15)]
+
+
+def test_start_ranges_should_only_keep_gaps_long_enough_for_duration():
+    assert start_ranges([(5, 8), (10, 15)], 4) == [(10, 11)]
+
+
+def test_interval_index_should_only_block_opaque_tag_intervals_missing_a_task_tag():
+    interval_index = IntervalIndex(
+        reserved_intervals=[(0, 2)],
+        reserved_tags=[
+            ReservedTag(start=4, end=6, tags=frozenset(['Perso', 'Autre']), is_transparent=False),
+            ReservedTag(start=8, end=10, tags=frozenset(['Perso']), is_transparent=True),
+        ],
+        start=0,
+        horizon=12
+    )
+    assert interval_index.start_ranges([], 2) == [(2, 2), (6, 10)]
+    assert interval_index.start_ranges(['Perso'], 2) == [(4, 4), (8, 8)]
+    assert interval_index.blocked(['Perso']) == [(0, 2)]
+    assert interval_index.blocked(['Perso', 'Loisirs']) == [(0, 2), (4, 6)]
+
+
+def test_interval_index_should_restrict_tagged_tasks_to_windows_holding_each_tag():
+    interval_index = IntervalIndex(
+        reserved_intervals=[],
+        reserved_tags=[
+            ReservedTag(start=0, end=4, tags=frozenset(['Perso']), is_transparent=True),
+            ReservedTag(start=3, end=9, tags=frozenset(['Perso']), is_transparent=True),
+            ReservedTag(start=6, end=12, tags=frozenset(['Sport']), is_transparent=True),
+        ],
+        start=0,
+        horizon=20
+    )
+    assert interval_index.window_ranges('Perso', 3) == [(0, 1), (3, 6)]
+    assert interval_index.window_ranges('Perso', 2) == [(0, 7)]
+    assert interval_index.start_ranges(['Perso'], 3) == [(0, 1), (3, 6)]
+    assert interval_index.start_ranges(['Perso', 'Sport'], 3) == [(6, 6)]
+    assert interval_index.start_ranges(['Loisirs'], 3) == []
+
+
+def test_overlapping_groups_should_chain_items_through_overlapping_ranges():
+    assert overlapping_groups([[(0, 4)], [(10, 12)], [(3, 6), (20, 22)], [(21, 30)], [], [(6, 8)]]) == [[0, 2, 3], [1], [4], [5]]
+
+
+def test_interval_index_cache_should_reuse_the_index_of_a_calendar_for_every_horizon():
+    interval_index_cache = IntervalIndexCache(max_size=1)
+    reserved_intervals = [ReservedInterval(start=2, end=4)]
+    reserved_tags = [ReservedTag(start=6, end=12, tags=frozenset(['Sport']), is_transparent=False)]
+    interval_index = interval_index_cache.get(reserved_intervals, reserved_tags, 0, 20)
+    assert interval_index.start_ranges([], 2) == [(0, 0), (4, 4), (12, 18)]
+    assert interval_index_cache.get(list(reserved_intervals), list(reserved_tags), 0, 20) is interval_index
+    shorter_index = interval_index_cache.get(reserved_intervals, reserved_tags, 0, 14)
+    assert shorter_index.start_ranges([], 2) == [(0, 0), (4, 4), (12, 12)]
+    assert shorter_index.start_ranges(['Sport'], 2) == [(6, 10)]
+    assert shorter_index.blocked([]) is interval_index.blocked([])
+    assert interval_index.start_ranges([], 2) == [(0, 0), (4, 4), (12, 18)]
+    interval_index_cache.get([], [], 0, 20)
+    interval_index_cache.get(reserved_intervals, reserved_tags, 0, 20)
+    assert (interval_index_cache.hits, interval_index_cache.misses) == (2, 3)
@@ -0,0 +1,196 @@
+import collections
+import copy
+import math
+import threading
+
+
+# Sort [start, end) intervals and coalesce the ones that overlap or touch
+def merge_intervals(intervals):
+    merged = []
+    for interval_start, interval_end in sorted(intervals):
+        if interval_end <= interval_start:
+            continue
+        if merged and interval_start <= merged[-1][1]:
+            if interval_end > merged[-1][1]:
+                merged[-1][1] = interval_end
+        else:
+            merged.append([interval_start, interval_end])
+    return [(interval_start, interval_end) for interval_start, interval_end in merged]
+
+
+# Free [start, end) gaps left between start and horizon by a merged blocked timeline
+def free_gaps(blocked, start, horizon):
+    gaps = []
+    cursor = start
+    for blocked_start, blocked_end in blocked:
+        if blocked_end <= cursor:
+            continue
+        if blocked_start >= horizon:
+            break
+        if blocked_start > cursor:
+            gaps.append((cursor, blocked_start))
+        cursor = max(cursor, blocked_end)
+    if cursor < horizon:
+        gaps.append((cursor, horizon))
+    return gaps
+
+
+# Closed [first, last] ranges of start values for which a task of given duration fits in a gap
+def start_ranges(gaps, duration):
+    return [(gap_start, gap_end - duration) for gap_start, gap_end in gaps if gap_end - gap_start >= duration]
+
+
+# Intersection of two sorted lists of disjoint closed [first, last] ranges
+def intersect_ranges(ranges, other_ranges):
+    intersection = []
+    i, j = 0, 0
+    while i < len(ranges) and j < len(other_ranges):
+        first = max(ranges[i][0], other_ranges[j][0])
+        last = min(ranges[i][1], other_ranges[j][1])
+        if first <= last:
+            intersection.append((first, last))
+        if ranges[i][1] < other_ranges[j][1]:
+            i += 1
+        else:
+            j += 1
+    return intersection
+
+
+
+# Group items whose [start, end) ranges overlap, directly or through other items.
+# ranges_by_item lists the ranges of each item, each group lists item indices in order.
+def overlapping_groups(ranges_by_item):
+    parents = list(range(len(ranges_by_item)))
+
+    def find(item):
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    # Sweep the ranges by start, an item joins the current cluster when it starts before the cluster ends
+    cluster_end, cluster_item = None, None
+    for range_start, range_end, item in sorted([
+        (range_start, range_end, item) for item, ranges in enumerate(ranges_by_item)
+        for range_start, range_end in ranges if range_end > range_start
+    ]):
+        if cluster_end is not None and range_start < cluster_end:
+            parents[find(item)] = find(cluster_item)
+            cluster_end = max(cluster_end, range_end)
+        else:
+            cluster_end, cluster_item = range_end, item
+
+    groups = {}
+    for item in range(len(ranges_by_item)):
+        groups.setdefault(find(item), []).append(item)
+    return list(groups.values())
+
+class IntervalIndex:
+    # Precompute the blocked timelines and tag windows of a request once, so that
+    # each (tag set, duration) class of tasks only looks up the start values it can
+    # take instead of adding constraints per reserved interval.
+    # reserved_intervals are (start, end) pairs, reserved_tags have start, end, tags and is_transparent
+    def __init__(self, reserved_intervals, reserved_tags, start, horizon):
+        self.start = start
+        self.horizon = horizon
+        self.reserved_tags = list(reserved_tags)
+        # Reserved events block every task
+        self.events = merge_intervals(reserved_intervals)
+        # Reserved tag windows in which a task holding the tag may be planned
+        self.windows_by_tag = {}
+        for window in self.reserved_tags:
+            for tag in window.tags:
+                self.windows_by_tag.setdefault(tag, []).append(window)
+        self._blocked_by_tags = {}
+        self._window_ranges_by_tag = {}
+        self._unbounded_ranges_by_class = {}
+        self._ranges_by_class = {}
+
+    # Merged timeline of everything a task with these tags cannot overlap
+    def blocked(self, tags):
+        tags = frozenset(tags)
+        if tags not in self._blocked_by_tags:
+            # An opaque tag interval is incompatible unless it holds every task tag
+            incompatible = [
+                (window.start, window.end) for window in self.reserved_tags
+                if not window.is_transparent and (not tags or not tags <= window.tags)
+            ]
+            self._blocked_by_tags[tags] = merge_intervals(self.events + incompatible)
+        return self._blocked_by_tags[tags]
+
+    # Start ranges for which a task of given duration fits entirely in one window holding the tag
+    def window_ranges(self, tag, duration):
+        key = (tag, duration)
+        if key not in self._window_ranges_by_tag:
+            ranges = [
+                (window.start, window.end - duration) for window in self.windows_by_tag.get(tag, [])
+                if window.end - window.start >= duration
+            ]
+            # Merge closed ranges through their half-open equivalent
+            self._window_ranges_by_tag[key] = [
+                (first, last - 1) for first, last in merge_intervals((first, last + 1) for first, last in ranges)
+            ]
+        return self._window_ranges_by_tag[key]
+
+    # Sorted, disjoint [first, last] start ranges for a task with these tags and duration
+    def start_ranges(self, tags, duration):
+        key = (frozenset(tags), duration)
+        if key not in self._ranges_by_class:
+            # Ranges without horizon, then the ones ending before the horizon
+            if key not in self._unbounded_ranges_by_class:
+                gaps = free_gaps(self.blocked(key[0]), self.start, math.inf)
+                ranges = start_ranges(gaps, duration)
+                # Each task tag must fit in a compatible window
+                for tag in sorted(key[0]):
+                    ranges = intersect_ranges(ranges, self.window_ranges(tag, duration))
+                self._unbounded_ranges_by_class[key] = ranges
+            last_start = self.horizon - duration
+            self._ranges_by_class[key] = [
+                (first, min(last, last_start)) for first, last in self._unbounded_ranges_by_class[key] if first <= last_start
+            ]
+        return self._ranges_by_class[key]
+
+    # Index of the same calendar up to another horizon. It shares everything computed
+    # so far but the start ranges, which it clips to its horizon.
+    def for_horizon(self, horizon):
+        interval_index = copy.copy(self)
+        interval_index.horizon = horizon
+        interval_index._ranges_by_class = {}
+        return interval_index
+
+
+class IntervalIndexCache:
+    # Interval indexes of the last max_size calendars (reserved intervals, reserved
+    # tags and start), so that the requests of a calendar whose tasks changed reuse
+    # the timelines computed for the previous ones. Each process keeps its own.
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.indexes = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # reserved_intervals are ReservedInterval, reserved_tags ReservedTag
+    def get(self, reserved_intervals, reserved_tags, start, horizon):
+        key = (tuple(reserved_intervals), tuple(reserved_tags), start)
+        with self.lock:
+            interval_index = self.indexes.get(key)
+            if interval_index is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if interval_index is None:
+            interval_index = IntervalIndex(
+                [(reserved_interval.start, reserved_interval.end) for reserved_interval in reserved_intervals], reserved_tags, start, horizon
+            )
+        elif interval_index.horizon != horizon:
+            interval_index = interval_index.for_horizon(horizon)
+        with self.lock:
+            self.indexes[key] = interval_index
+            self.indexes.move_to_end(key)
+            while len(self.indexes) > self.max_size:
+                self.indexes.popitem(last=False)
+        return interval_index
+
+
+interval_indexes = IntervalIndexCache(max_size=128)